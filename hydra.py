@@ -3,21 +3,41 @@ from __future__ import annotations
 
 import argparse
 import fnmatch
-import glob as globlib
+import functools
+import itertools
 import json
+import mmap
 import os
 import re
+import shlex
 import shutil
 import sqlite3
+import stat
+import struct
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NoReturn, Optional, Sequence, TextIO, Tuple
 
 from pathlib import PurePosixPath
 
+try:  # Optional accelerator; hydra.py stays usable with the stdlib alone.
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
 
 class HydraError(RuntimeError):
     pass
@@ -32,6 +52,69 @@ LOCKS_DB_NAME = "locks.db"
 CONFIG_NAME = "config.json"
 DEFAULT_SHARED_DEPS = ["node_modules", "venv", ".venv", "target"]
 ZELLIJ_LAYOUT_NAME = "layout.kdl"
+# Max bound parameters per `IN (...)` query; stays well under SQLITE_MAX_VARIABLE_NUMBER.
+SQL_IN_CHUNK = 500
+# `.hydra/journal.idx`: a header (magic, inode of the journal it indexes), then
+# records (ts: uint32, byte offset into journal.jsonl: uint64). The stored ts is
+# the running maximum so records stay sorted when the clock steps back.
+JOURNAL_INDEX_HEADER = struct.Struct("<8sQ")
+JOURNAL_INDEX_MAGIC = b"HYDRAIX2"
+JOURNAL_INDEX_RECORD = struct.Struct("<IQ")
+# Index seeks start this many seconds early: appends racing across processes
+# can still land a slightly smaller running maximum after a larger one.
+JOURNAL_SEEK_SLACK = 60
+# Appends up to this size are written atomically with O_APPEND on local
+# filesystems; longer lines fall back to an advisory flock.
+JOURNAL_ATOMIC_WRITE = 4096
+_JOURNAL_LOCK = threading.Lock()
+
+_RE_TASK_ID = re.compile(r"t[0-9]+")
+_RE_TASK_DIR = re.compile(r"t[0-9]{6,}")
+_RE_TASK_HEAD_FIELD = re.compile(rb'"(id|title|created)"\s*:\s*("(?:[^"\\]|\\.)*"|-?[0-9]+(?=\s*[,}]))')
+TASK_HEAD_BYTES = 512
+_SAFE_NAME_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._-")
+
+
+class _UnsafeCharTable(dict):
+    """str.translate table mapping every char outside _SAFE_NAME_CHARS to NUL (filled lazily)."""
+
+    def __missing__(self, cp: int) -> Optional[int]:
+        value = cp if chr(cp) in _SAFE_NAME_CHARS else 0
+        self[cp] = value
+        return value
+
+
+_UNSAFE_CHAR_TABLE = _UnsafeCharTable()
+
+_RE_DUR = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)")
+_RE_DUR_FULL = re.compile(r"(?:\d+(?:\.\d+)?\s*[a-z]+\s*)+")
+_UNIT_SECS = MappingProxyType(
+    {
+        "s": 1,
+        "sec": 1,
+        "secs": 1,
+        "second": 1,
+        "seconds": 1,
+        "m": 60,
+        "min": 60,
+        "mins": 60,
+        "minute": 60,
+        "minutes": 60,
+        "h": 3600,
+        "hr": 3600,
+        "hrs": 3600,
+        "hour": 3600,
+        "hours": 3600,
+        "d": 86400,
+        "day": 86400,
+        "days": 86400,
+        "w": 604800,
+        "week": 604800,
+        "weeks": 604800,
+    }
+)
+_RE_AGENT_HDR = re.compile(r"(?mi)^Agent:\s*\S+")
+_RE_TASK_HDR = re.compile(r"(?mi)^Task:\s*\S+")
 
 # Default Zellij layout (KDL). This is a per-project file created under `.hydra/`.
 ZELLIJ_LAYOUT_TEMPLATE = """// CodeHydra default Zellij layout
@@ -220,6 +303,93 @@ def _now_ts() -> int:
     return int(time.time())
 
 
+def _json_loads(data: "str | bytes") -> object:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps_bytes(obj: object, *, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON (non-ASCII kept as-is); `indent` pretty-prints with 2 spaces."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+# Per-call overrides from main(cwd=, stdout=, stderr=): lets an embedding host
+# (the MCP server) run commands concurrently without chdir or swapping sys streams.
+# Concurrent calls must be on separate threads (the locks DB connection is per thread).
+_CWD: "ContextVar[Optional[str]]" = ContextVar("hydra_cwd", default=None)
+_STDOUT: "ContextVar[Optional[TextIO]]" = ContextVar("hydra_stdout", default=None)
+_STDERR: "ContextVar[Optional[TextIO]]" = ContextVar("hydra_stderr", default=None)
+# Optional long-lived object reader from main(git_backend=...): any object with
+# `.root` and `.resolve(rev) -> Optional[str]`, reused instead of a new cat-file.
+_GIT_BACKEND: "ContextVar[Optional[object]]" = ContextVar("hydra_git_backend", default=None)
+
+
+def _cwd() -> str:
+    return _CWD.get() or os.getcwd()
+
+
+def _stdout() -> TextIO:
+    return _STDOUT.get() or sys.stdout
+
+
+def _stderr() -> TextIO:
+    return _STDERR.get() or sys.stderr
+
+
+@functools.lru_cache(maxsize=32)
+def _which(name: str, path: Optional[str]) -> Optional[str]:
+    return shutil.which(name, path=path)
+
+
+def _resolve_exe(name: str) -> str:
+    if os.sep in name:
+        return name
+    return _which(name, os.environ.get("PATH")) or name
+
+
+def _env_with(overrides: Mapping[str, str]) -> Dict[str, str]:
+    # Read os.environ per call: an embedding host may change it after import.
+    return {**os.environ, **overrides}
+
+
+def _fast_run(
+    argv: Sequence[str],
+    *,
+    cwd: "Optional[os.PathLike[str] | str]" = None,
+    check: bool = False,
+    capture: bool = True,
+    env: Optional[Dict[str, str]] = None,
+    text: bool = True,
+) -> subprocess.CompletedProcess:
+    """`subprocess.run` kept on CPython's posix_spawn path instead of fork+exec."""
+    spawn_argv = list(argv)
+    if cwd is None:
+        cwd = _CWD.get()
+    if spawn_argv:
+        spawn_argv[0] = _resolve_exe(spawn_argv[0])
+        if cwd and argv[0] == "git":
+            # `git -C dir` instead of cwd= keeps CPython on its posix_spawn path.
+            spawn_argv[1:1] = ["-C", str(cwd)]
+            cwd = None
+    pipe = subprocess.PIPE if capture else None
+    # Python-created fds are non-inheritable (PEP 446), so skipping the
+    # close-everything pass is safe. Together with an absolute executable
+    # and no cwd this lets subprocess use posix_spawn instead of fork.
+    return subprocess.run(  # nosec - CLI tool by design
+        spawn_argv,
+        cwd=str(cwd) if cwd else None,
+        check=check,
+        stdout=pipe,
+        stderr=pipe,
+        text=text,
+        env=env,
+        close_fds=False,
+    )
+
+
 def _run(
     argv: Sequence[str],
     *,
@@ -227,20 +397,16 @@ def _run(
     check: bool = True,
     capture: bool = True,
     env: Optional[Dict[str, str]] = None,
+    text: bool = True,
 ) -> subprocess.CompletedProcess:
-    kwargs = {
-        "cwd": str(cwd) if cwd else None,
-        "check": False,
-        "text": True,
-        "env": env,
-    }
-    if capture:
-        kwargs["stdout"] = subprocess.PIPE
-        kwargs["stderr"] = subprocess.PIPE
-    proc = subprocess.run(list(argv), **kwargs)  # nosec - CLI tool by design
+    proc = _fast_run(argv, cwd=cwd, capture=capture, env=env, text=text)
     if check and proc.returncode != 0:
-        stderr = (proc.stderr or "").strip()
-        stdout = (proc.stdout or "").strip()
+        stderr = proc.stderr or ""
+        stdout = proc.stdout or ""
+        if not text:
+            stderr = stderr.decode("utf-8", "replace")
+            stdout = stdout.decode("utf-8", "replace")
+        stderr, stdout = stderr.strip(), stdout.strip()
         msg = f"Command failed ({proc.returncode}): {' '.join(argv)}"
         if stdout:
             msg += f"\nSTDOUT:\n{stdout}"
@@ -250,12 +416,36 @@ def _run(
     return proc
 
 
+def _run_sh_steps(steps: Sequence[Sequence[str]]) -> List[Tuple[int, str]]:
+    """
+    Run several commands through one `sh -c`, each regardless of how the previous
+    one exited. Returns (returncode, combined stdout/stderr) per step.
+    """
+    marker = f"__hydra_step_{os.urandom(6).hex()}__"
+    script = "; ".join(
+        f"{shlex.join([_resolve_exe(step[0]), *step[1:]])} 2>&1; printf '\\n{marker} %d\\n' $?" for step in steps
+    )
+    proc = _run(["sh", "-c", script], check=False, capture=True)
+    results: List[Tuple[int, str]] = []
+    chunk: List[str] = []
+    for line in (proc.stdout or "").split("\n"):
+        if line.startswith(f"{marker} "):
+            results.append((int(line[len(marker) + 1 :]), "\n".join(chunk).strip()))
+            chunk = []
+        else:
+            chunk.append(line)
+    # The shell itself failed part-way: report the remaining steps as failed.
+    while len(results) < len(steps):
+        results.append((proc.returncode or 1, (proc.stderr or "").strip()))
+    return results
+
+
 def _git(root: Path, args: Sequence[str], *, capture: bool = True) -> subprocess.CompletedProcess:
     return _run(["git", *args], cwd=root, capture=capture)
 
 
-def _tmux(args: Sequence[str], *, capture: bool = True) -> subprocess.CompletedProcess:
-    return _run(["tmux", *args], capture=capture)
+def _tmux(args: Sequence[str], *, capture: bool = True, check: bool = True) -> subprocess.CompletedProcess:
+    return _run(["tmux", *args], capture=capture, check=check)
 
 
 def _tmux_available() -> bool:
@@ -268,9 +458,40 @@ def _zellij_available() -> bool:
     # return shutil.which("zellij") is not None
 
 
+def _wait_for_nonempty(path: str, *, timeout: float) -> bool:
+    delay = 0.01
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if os.stat(path).st_size > 0:
+                return True
+        except FileNotFoundError:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay *= 2
+
+
 def _find_project_root(start: Optional[Path] = None) -> Path:
-    cur = (start or Path.cwd()).resolve()
-    # Prefer the common git dir so this works inside linked worktrees.
+    return _find_project_root_cached(str(start) if start is not None else _cwd())
+
+
+@functools.lru_cache(maxsize=8)
+def _find_project_root_cached(start_key: str) -> Path:
+    cur = Path(start_key).resolve()
+    # Fast path: a plain `.git` directory needs no git subprocess. A `.git` file
+    # marks a linked worktree (or submodule); ask git for the common dir then.
+    for candidate in (cur, *cur.parents):
+        git_path = candidate / ".git"
+        if git_path.is_dir():
+            return candidate
+        if git_path.exists():
+            break
+    else:
+        raise HydraError("Not inside a git repository (could not find a .git directory).")
+
     try:
         out = _run(["git", "rev-parse", "--git-common-dir"], cwd=cur, capture=True).stdout.strip()
         if out:
@@ -291,15 +512,26 @@ def _find_project_root(start: Optional[Path] = None) -> Path:
 
 
 def _find_hydra_root_for_hooks() -> Path:
-    explicit = os.environ.get("HYDRA_PROJECT_ROOT", "").strip()
+    return _find_hydra_root_for_hooks_cached(_cwd(), os.environ.get("HYDRA_PROJECT_ROOT", ""))
+
+
+@functools.lru_cache(maxsize=4)
+def _find_hydra_root_for_hooks_cached(cwd_key: str, env_key: str) -> Path:
+    explicit = env_key.strip()
     if explicit:
         p = Path(explicit).expanduser()
         if p.exists():
             return p.resolve()
-    return _find_project_root()
+    return _find_project_root(Path(cwd_key))
 
 
 def _ensure_dirs(root: Path) -> Tuple[Path, Path, Path]:
+    return _ensure_dirs_cached(str(root))
+
+
+@functools.lru_cache(maxsize=8)
+def _ensure_dirs_cached(root_key: str) -> Tuple[Path, Path, Path]:
+    root = Path(root_key)
     hydra_dir = root / HYDRA_DIRNAME
     agents_dir = root / AGENTS_DIRNAME
     tasks_dir = root / TASKS_DIRNAME
@@ -309,112 +541,143 @@ def _ensure_dirs(root: Path) -> Tuple[Path, Path, Path]:
     return hydra_dir, agents_dir, tasks_dir
 
 
+def _reset_invocation_caches() -> None:
+    # Caches are per invocation: a long-lived host (the MCP server) may call
+    # main() repeatedly while directories and branches change underneath it.
+    _find_project_root_cached.cache_clear()
+    _find_hydra_root_for_hooks_cached.cache_clear()
+    _ensure_dirs_cached.cache_clear()
+    _ensure_config_cached.cache_clear()
+    _default_base_ref_cached.cache_clear()
+    _default_trunk_ref_cached.cache_clear()
+    _TMUX_WINDOWS.clear()
+
+
 def _ensure_config(hydra_dir: Path) -> Path:
-    cfg = hydra_dir / CONFIG_NAME
+    return _ensure_config_cached(str(hydra_dir))
+
+
+@functools.lru_cache(maxsize=8)
+def _ensure_config_cached(hydra_dir_key: str) -> Path:
+    cfg = Path(hydra_dir_key) / CONFIG_NAME
     if not cfg.exists():
-        cfg.write_text(json.dumps({"created": _now_ts(), "version": "0.1.0"}, indent=2) + "\n", encoding="utf-8")
+        cfg.write_bytes(_json_dumps_bytes({"created": _now_ts(), "version": "0.1.0"}, indent=True) + b"\n")
     return cfg
 
 
+def _load_config(hydra_dir: Path) -> Dict[str, object]:
+    """Parsed `.hydra/config.json` ({} if missing or invalid); callers must not mutate it."""
+    cfg_path = hydra_dir / CONFIG_NAME
+    try:
+        st = os.stat(cfg_path)
+    except OSError:
+        return {}
+    return _load_config_cached(str(cfg_path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(path: str, _mtime_ns: int, _size: int) -> Dict[str, object]:
+    try:
+        with open(path, "rb") as f:
+            data = _json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _cached_session_name(hydra_dir: Path, root: Path) -> str:
+    # Served from _load_config's (mtime, size)-keyed cache, which survives across
+    # main() calls: repeat lookups in one process cost a single stat.
+    return _load_config(hydra_dir).get("tmux_session", root.name)
+
+
 def _ensure_zellij_layout(hydra_dir: Path, *, quiet: bool = True) -> Path:
     layout_path = hydra_dir / ZELLIJ_LAYOUT_NAME
     if not layout_path.exists():
         layout_path.write_text(ZELLIJ_LAYOUT_TEMPLATE, encoding="utf-8")
         if not quiet:
-            print(f"Created {layout_path}")
+            print(f"Created {layout_path}", file=_stdout())
     return layout_path
 
 
+def _tmux_list_sessions() -> Dict[str, str]:
+    """Return {session_name: session_path} for all tmux sessions ({} if no server)."""
+    result = _fast_run(
+        ["tmux", "list-sessions", "-F", "#{session_name}\t#{session_path}"]
+    )
+    if result.returncode != 0:
+        return {}
+    sessions: Dict[str, str] = {}
+    for line in result.stdout.splitlines():
+        name, _sep, path = line.partition("\t")
+        if name:
+            sessions[name] = path
+    return sessions
+
+
 def _ensure_tmux_session(root: Path, hydra_dir: Path, explicit_session: Optional[str] = None) -> None:
     """Ensure tmux session exists for the project."""
     if not _tmux_available():
-        print("hydra warning: tmux not found; skipping tmux session creation", file=sys.stderr)
+        print("hydra warning: tmux not found; skipping tmux session creation", file=_stderr())
         _save_session_name(hydra_dir, explicit_session or root.name)
         return
 
+    sessions = _tmux_list_sessions()
+
     # If explicit session name provided, use it directly
     if explicit_session:
-        result = subprocess.run(
-            ["tmux", "has-session", "-t", explicit_session],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            print(f"Tmux session '{explicit_session}' already exists")
+        if explicit_session in sessions:
+            print(f"Tmux session '{explicit_session}' already exists", file=_stdout())
             _save_session_name(hydra_dir, explicit_session)
             return
         # Create the session with explicit name
         try:
-            subprocess.run(
+            _fast_run(
                 ["tmux", "new-session", "-d", "-s", explicit_session, "-c", str(root)],
-                check=True,
-                capture_output=True,
-                text=True
+                check=True
             )
-            print(f"Created tmux session '{explicit_session}'")
+            print(f"Created tmux session '{explicit_session}'", file=_stdout())
             _save_session_name(hydra_dir, explicit_session)
         except subprocess.CalledProcessError as e:
-            print(f"Warning: Failed to create tmux session: {e.stderr}")
+            print(f"Warning: Failed to create tmux session: {e.stderr}", file=_stdout())
         return
 
     base_name = root.name
     session_name = base_name
     suffix = 0
 
-    while True:
-        # Check if session exists
-        result = subprocess.run(
-            ["tmux", "has-session", "-t", session_name],
-            capture_output=True,
-            text=True
-        )
-
-        if result.returncode != 0:
-            # Session doesn't exist, create it
-            break
-
-        # Session exists, check if it's for this project
-        cwd_result = subprocess.run(
-            ["tmux", "display-message", "-t", f"{session_name}:0", "-p", "#{pane_current_path}"],
-            capture_output=True,
-            text=True
-        )
-
-        if cwd_result.returncode == 0:
-            session_cwd = Path(cwd_result.stdout.strip())
-            if session_cwd == root:
-                print(f"Tmux session '{session_name}' already exists for this project")
-                _save_session_name(hydra_dir, session_name)
-                return
-
+    # Pick the first free name, unless an existing one was started in this project.
+    while session_name in sessions:
+        if Path(sessions[session_name]) == root:
+            print(f"Tmux session '{session_name}' already exists for this project", file=_stdout())
+            _save_session_name(hydra_dir, session_name)
+            return
         # Different project, try next suffix
         suffix += 1
         session_name = f"{base_name}-{suffix}"
 
     # Create new session
     try:
-        subprocess.run(
+        _fast_run(
             ["tmux", "new-session", "-d", "-s", session_name, "-c", str(root)],
-            check=True,
-            capture_output=True,
-            text=True
+            check=True
         )
-        print(f"Created tmux session '{session_name}'")
+        print(f"Created tmux session '{session_name}'", file=_stdout())
         _save_session_name(hydra_dir, session_name)
     except subprocess.CalledProcessError as e:
-        print(f"Warning: Failed to create tmux session: {e.stderr}")
+        print(f"Warning: Failed to create tmux session: {e.stderr}", file=_stdout())
 
 
 def _ensure_zellij_session(root: Path, hydra_dir: Path) -> None:
     """Ensure Zellij session exists for the project."""
     if not _zellij_available():
-        print("hydra warning: zellij not found; skipping zellij session creation", file=sys.stderr)
+        print("hydra warning: zellij not found; skipping zellij session creation", file=_stderr())
         _save_session_name(hydra_dir, root.name)
         return
 
     layout_path = hydra_dir / ZELLIJ_LAYOUT_NAME
     if not layout_path.exists():
-        print(f"hydra warning: layout file {layout_path} not found", file=sys.stderr)
+        print(f"hydra warning: layout file {layout_path} not found", file=_stderr())
         _save_session_name(hydra_dir, root.name)
         return
 
@@ -422,10 +685,8 @@ def _ensure_zellij_session(root: Path, hydra_dir: Path) -> None:
 
     # Check if session exists by listing sessions
     try:
-        result = subprocess.run(
+        result = _fast_run(
             ["zellij", "list-sessions"],
-            capture_output=True,
-            text=True,
             check=False
         )
 
@@ -434,7 +695,7 @@ def _ensure_zellij_session(root: Path, hydra_dir: Path) -> None:
             for line in result.stdout.splitlines():
                 # Session line format: "session-name [Created ...] (current/EXITED)"
                 if line.strip().startswith(session_name + " "):
-                    print(f"Zellij session '{session_name}' already exists for this project")
+                    print(f"Zellij session '{session_name}' already exists for this project", file=_stdout())
                     _save_session_name(hydra_dir, session_name)
                     return
     except subprocess.CalledProcessError:
@@ -443,89 +704,94 @@ def _ensure_zellij_session(root: Path, hydra_dir: Path) -> None:
     # Session doesn't exist, create it in detached mode
     # Note: Zellij doesn't have a direct "detached" mode like tmux
     # We create the session but it will need to be attached manually
-    print(f"Zellij session '{session_name}' needs to be created manually.")
-    print(f"Run: zellij --new-session-with-layout {layout_path} -s {session_name}")
+    print(f"Zellij session '{session_name}' needs to be created manually.", file=_stdout())
+    print(f"Run: zellij --new-session-with-layout {layout_path} -s {session_name}", file=_stdout())
     _save_session_name(hydra_dir, session_name)
 
 
 def _save_session_name(hydra_dir: Path, session_name: str) -> None:
     """Save tmux session name to config file."""
     cfg_path = hydra_dir / CONFIG_NAME
-    if cfg_path.exists():
-        cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
-    else:
+    try:
+        cfg = _json_loads(cfg_path.read_bytes())
+    except FileNotFoundError:
         cfg = {}
+    if cfg.get("tmux_session") == session_name:
+        return
     cfg["tmux_session"] = session_name
-    cfg_path.write_text(json.dumps(cfg, indent=2) + "\n", encoding="utf-8")
+    tmp = cfg_path.with_suffix(f".json.{os.getpid()}.tmp")
+    tmp.write_bytes(_json_dumps_bytes(cfg, indent=True) + b"\n")
+    os.replace(tmp, cfg_path)
+
+
+def _zellij_in_tab(
+    tab: str, actions: Sequence[Sequence[str]], *, return_to_main: bool = True
+) -> subprocess.CompletedProcess:
+    """Focus `tab` and run zellij actions there in one shell, by default returning to `main` after."""
+    script = " && ".join(shlex.join(["zellij", "action", *a]) for a in [["go-to-tab-name", tab], *actions])
+    if return_to_main:
+        script = f"{script}; rc=$?; zellij action go-to-tab-name main; exit $rc"
+    return _fast_run(["sh", "-c", script], check=True)
 
 
 def _spawn_agent_zellij(session_name: str, tab_name: str, worktree: Path, cmd: List[str]) -> None:
     """Spawn an agent in a new Zellij tab."""
-    # Create new tab
-    subprocess.run(
-        ["zellij", "action", "new-tab", "-n", tab_name],
-        check=True,
-        capture_output=True,
-        text=True
+    # One shell drives the whole sequence: create/focus the tab, type
+    # `cd <worktree> && <cmd>` followed by Enter, then return to `main`.
+    tab = shlex.quote(tab_name)
+    line = f"cd {shlex.quote(str(worktree))} && {' '.join(shlex.quote(c) for c in cmd)}\n"
+    script = " && ".join(
+        [
+            f"zellij action new-tab -n {tab}",
+            f"zellij action go-to-tab-name {tab}",
+            f"zellij action write-chars {shlex.quote(line)}",
+            "zellij action go-to-tab-name main",
+        ]
     )
-
-    # Switch to the new tab
-    subprocess.run(
-        ["zellij", "action", "go-to-tab-name", tab_name],
-        check=True,
-        capture_output=True,
-        text=True
+    _fast_run(
+        ["sh", "-c", script],
+        check=True
     )
 
-    # Change to worktree directory
-    cd_cmd = f"cd {worktree}"
-    subprocess.run(
-        ["zellij", "action", "write-chars", cd_cmd],
-        check=True,
-        capture_output=True,
-        text=True
-    )
-    subprocess.run(
-        ["zellij", "action", "write", "10"],  # Send Enter (ASCII 10)
-        check=True,
-        capture_output=True,
-        text=True
-    )
 
-    # Send agent command
-    agent_cmd = " ".join(cmd)
-    subprocess.run(
-        ["zellij", "action", "write-chars", agent_cmd],
-        check=True,
-        capture_output=True,
-        text=True
-    )
-    subprocess.run(
-        ["zellij", "action", "write", "10"],  # Send Enter
-        check=True,
-        capture_output=True,
-        text=True
-    )
+def _chunks(items: Iterable[str], size: int) -> Iterable[List[str]]:
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
 
-    # Wait 0.5 second before switching back
-    time.sleep(0.5)
 
-    # Switch back to main tab
-    subprocess.run(
-        ["zellij", "action", "go-to-tab-name", "main"],
-        check=True,
-        capture_output=True,
-        text=True
-    )
+# One connection per (thread, database): concurrent main() calls each run their
+# own BEGIN IMMEDIATE/COMMIT, which a shared connection would interleave.
+_LOCKS_CONN = threading.local()
 
 
 def _connect_db(hydra_dir: Path) -> sqlite3.Connection:
-    db_path = hydra_dir / LOCKS_DB_NAME
-    conn = sqlite3.connect(str(db_path))
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys=ON;")
-    conn.execute(
+    key = str(hydra_dir / LOCKS_DB_NAME)
+    conns: Optional[Dict[str, sqlite3.Connection]] = getattr(_LOCKS_CONN, "by_path", None)
+    if conns is None:
+        conns = _LOCKS_CONN.by_path = {}
+    conn = conns.get(key)
+    if conn is not None:
+        if os.path.exists(key):
+            return conn
+        # The database was removed underneath us (e.g. `.hydra` wiped); start over.
+        conns.pop(key, None)
+        conn.close()
+    # Autocommit mode: writers issue their own BEGIN IMMEDIATE / COMMIT.
+    conn = sqlite3.connect(key, isolation_level=None)
+    conn.executescript(
         """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        PRAGMA wal_autocheckpoint=10000;
+        PRAGMA cache_size=-8000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=134217728;
+        PRAGMA foreign_keys=ON;
         CREATE TABLE IF NOT EXISTS locks (
           file TEXT PRIMARY KEY,
           agent TEXT NOT NULL,
@@ -533,18 +799,29 @@ def _connect_db(hydra_dir: Path) -> sqlite3.Connection:
           locked_at INTEGER NOT NULL,
           tmux_session TEXT
         );
+        CREATE INDEX IF NOT EXISTS locks_agent_task_idx ON locks(agent, task);
+        CREATE TABLE IF NOT EXISTS meta (
+          key TEXT PRIMARY KEY,
+          value TEXT
+        );
         """
     )
-    conn.execute("CREATE INDEX IF NOT EXISTS locks_agent_task_idx ON locks(agent, task);")
-    conn.commit()
+    conns[key] = conn
     return conn
 
 
 def _write_executable(path: Path, content: str) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(content, encoding="utf-8")
-    mode = path.stat().st_mode
-    path.chmod(mode | 0o111)
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+    try:
+        os.write(fd, content.encode("utf-8"))
+        # New files already carry the exec bits (modulo umask); only fix up
+        # pre-existing files or a restrictive umask.
+        mode = os.fstat(fd).st_mode
+        if mode & 0o111 != 0o111:
+            os.fchmod(fd, stat.S_IMODE(mode) | 0o111)
+    finally:
+        os.close(fd)
 
 
 def _install_git_hooks(root: Path) -> None:
@@ -591,12 +868,19 @@ def _install_git_hooks(root: Path) -> None:
     _git(root, ["config", "core.hooksPath", str(hooks_dir.resolve())], capture=True)
 
 
+def _scrub_unsafe(value: str) -> str:
+    # Equivalent to re.sub(r"[^A-Za-z0-9._-]+", "-", value).strip("-"), done with
+    # one C-level translate: runs of unsafe chars become NUL-separated gaps.
+    joined = "-".join(piece for piece in value.translate(_UNSAFE_CHAR_TABLE).split("\0") if piece)
+    return joined.strip("-")
+
+
 def _sanitize_ref_component(value: str, *, label: str) -> str:
     if not value:
         raise MctlError(f"{label} must be non-empty.")
     if "/" in value or value.startswith(".") or value.endswith("."):
         raise MctlError(f"Invalid {label}: {value!r}")
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "-", value).strip("-")
+    safe = _scrub_unsafe(value)
     if not safe:
         raise MctlError(f"Invalid {label}: {value!r}")
     return safe
@@ -604,7 +888,7 @@ def _sanitize_ref_component(value: str, *, label: str) -> str:
 
 def _sanitize_task_id(task_id: str) -> str:
     # 支持两种格式：t1737123456（时间戳）或 t3005（短编号）
-    if not re.fullmatch(r"t[0-9]+", task_id):
+    if not _RE_TASK_ID.fullmatch(task_id):
         raise MctlError(f"Invalid task id: {task_id!r} (expected like t1737123456 or t3005)")
     return task_id
 
@@ -615,6 +899,7 @@ def _is_glob_pattern(pattern: str) -> bool:
     return any(ch in pattern for ch in "*?[]")
 
 
+@functools.lru_cache(maxsize=1024)
 def _validate_allow_pattern(pattern: str) -> str:
     if not pattern:
         raise MctlError("Empty allow pattern is not allowed.")
@@ -626,52 +911,183 @@ def _validate_allow_pattern(pattern: str) -> str:
     return norm.lstrip("./")
 
 
+def _compile_fnmatch_union(patterns: Sequence[str]) -> "re.Pattern[str]":
+    """Compile fnmatch-style patterns into one alternation regex (use with `.match`)."""
+    if not patterns:
+        return re.compile(r"(?!)")  # matches nothing
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+
+def _glob_segment_regex(segment: str) -> str:
+    """Regex for one glob path segment: wildcards stay inside it and, as in glob, skip dotfiles."""
+    out = [] if segment.startswith(".") else [r"(?!\.)"]
+    i, n = 0, len(segment)
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == "*":
+            if not out or out[-1] != "[^/]*":
+                out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and segment[j] == "!":
+                j += 1
+            if j < n and segment[j] == "]":
+                j += 1
+            while j < n and segment[j] != "]":
+                j += 1
+            if j >= n:
+                out.append(r"\[")
+                continue
+            body = segment[i:j].replace("\\", "\\\\")
+            i = j + 1
+            if body.startswith("!"):
+                body = "^/" + body[1:]
+            elif body.startswith(("^", "[")):
+                body = "\\" + body
+            out.append(f"[{body}]")
+        else:
+            out.append(re.escape(c))
+    return "".join(out)
+
+
+def _glob_regex(pattern: str) -> str:
+    """Translate a `glob.glob(recursive=True)` pattern into a regex over '/'-separated paths."""
+    segments = [seg for seg in pattern.split("/") if seg]
+    parts: List[str] = []
+    for idx, seg in enumerate(segments):
+        if seg == "**":
+            # Zero or more non-hidden directories; as the last segment, also the file.
+            parts.append(r"(?:(?!\.)[^/]+/)*")
+            if idx == len(segments) - 1:
+                parts.append(r"(?!\.)[^/]+")
+        else:
+            parts.append(_glob_segment_regex(seg) + ("/" if idx < len(segments) - 1 else ""))
+    return "".join(parts) + r"\Z"
+
+
+# Never descended into when expanding allow globs: git metadata and hydra's own state.
+_LOCK_WALK_PRUNE = frozenset({".git", ".hydra", ".agents"})
+
+
 def _expand_allow(root: Path, allow: Sequence[str]) -> List[str]:
     locked: set[str] = set()
+    glob_patterns: List[str] = []
     for raw in allow:
         pattern = _validate_allow_pattern(raw)
         if not _is_glob_pattern(pattern):
             # Lock explicit file paths even if they don't exist yet.
             locked.add(Path(pattern).as_posix())
             continue
-
-        matches = globlib.glob(str(root / pattern), recursive=True)
-        for m in matches:
-            p = Path(m)
-            try:
-                rp = p.resolve()
-            except FileNotFoundError:
-                continue
-            if not rp.is_file():
-                continue
-            try:
-                rel = rp.relative_to(root)
-            except ValueError:
-                continue
-            locked.add(rel.as_posix())
+        glob_patterns.append(pattern)
+    if not glob_patterns:
+        return sorted(locked)
+
+    # Walk from each pattern's literal directory prefix, only as deep as its
+    # segments reach (unbounded for '**'), and match with glob's per-segment rules.
+    combined = re.compile("|".join(f"(?:{_glob_regex(p)})" for p in glob_patterns))
+    walks: Dict[str, Optional[int]] = {}
+    for pattern in glob_patterns:
+        segments = [seg for seg in pattern.split("/") if seg]
+        n_literal = next(i for i, seg in enumerate(segments) if _is_glob_pattern(seg))
+        start = "".join(seg + "/" for seg in segments[:n_literal])
+        depth = None if "**" in segments else len(segments) - n_literal
+        prev = walks.get(start, 0)
+        walks[start] = None if prev is None or depth is None else max(prev, depth)
+    # glob's wildcards never enter dot-directories unless a segment spells the dot out.
+    hidden = any(seg.startswith(".") for p in glob_patterns for seg in p.split("/"))
+    for start, depth in walks.items():
+        _walk_allow_matches(root, start, depth, hidden, combined, locked)
     return sorted(locked)
 
 
-def _path_is_allowed(path: str, allow_patterns: Sequence[str]) -> bool:
-    normalized_path = path.replace("\\", "/")
-    for raw in allow_patterns:
-        pattern = _validate_allow_pattern(raw)
-        if fnmatch.fnmatch(normalized_path, pattern):
-            return True
-    return False
+def _walk_allow_matches(
+    root: Path, start: str, depth: Optional[int], hidden: bool, combined: "re.Pattern[str]", locked: set[str]
+) -> None:
+    # Like glob, follow symlinked directories and lock files at their resolved
+    # in-repo path; an unbounded walk visits each real directory once so link
+    # cycles end.
+    base = str(root)
+    start_dir = os.path.join(base, start)
+    if not os.path.isdir(start_dir):
+        return
+    seen: set[Tuple[int, int]] = set()
+    via_link = os.path.realpath(start_dir) != os.path.normpath(start_dir)
+    pending: List[Tuple[str, int, bool]] = [(start, 1, via_link)]
+    while pending:
+        rel_dir, level, linked = pending.pop()
+        path = os.path.join(base, rel_dir) if rel_dir else base
+        try:
+            if depth is None:
+                st = os.stat(path)
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                name = entry.name
+                rel = rel_dir + name
+                if entry.is_dir():
+                    if name in _LOCK_WALK_PRUNE or (name.startswith(".") and not hidden):
+                        continue
+                    if depth is None or level < depth:
+                        pending.append((rel + "/", level + 1, linked or entry.is_symlink()))
+                    continue
+                if not combined.match(rel) or not entry.is_file():
+                    continue
+                if linked or entry.is_symlink():
+                    # Lock what the link points at, provided it lives in the repo.
+                    try:
+                        rel = Path(entry.path).resolve().relative_to(root).as_posix()
+                    except (OSError, ValueError):
+                        continue
+                locked.add(rel)
+
+
+def _compile_allow(allow_patterns: Sequence[str]) -> "re.Pattern[str]":
+    """Compile task allow patterns once; match normalized ('/'-separated) paths against it."""
+    return _compile_fnmatch_union([_validate_allow_pattern(raw) for raw in allow_patterns])
 
 
 def _git_status_porcelain(worktree: Path) -> List[Tuple[str, str]]:
-    out = _run(["git", "status", "--porcelain"], cwd=worktree, capture=True).stdout
-    rows: List[Tuple[str, str]] = []
-    for line in (out or "").splitlines():
-        if not line:
+    # NUL-separated records ("XY path") with unquoted paths; --no-renames keeps
+    # every record to exactly one path. Paths are only decoded once sliced out.
+    out = _run(["git", "status", "--porcelain", "-z", "--no-renames"], cwd=worktree, capture=True, text=False).stdout
+    return [
+        (record[:2].decode("ascii", "replace"), record[3:].decode("utf-8", "surrogateescape"))
+        for record in (out or b"").split(b"\0")
+        if record
+    ]
+
+
+# Number of space-separated fields before the path in `git status --porcelain=v2`
+# records, keyed by record type ("1" ordinary, "2" rename/copy, "u" unmerged).
+_STATUS_V2_FIELDS = {"1": 8, "2": 9, "u": 10, "?": 1, "!": 1}
+
+
+def _git_status_v2(worktree: Path, *, untracked: bool = True) -> List[Tuple[str, str, str]]:
+    """Return (record type, XY, path) for each `git status --porcelain=v2 -z` entry."""
+    argv = ["git", "status", "--porcelain=v2", "-z", f"--untracked-files={'normal' if untracked else 'no'}"]
+    out = _run(argv, cwd=worktree, capture=True).stdout
+    rows: List[Tuple[str, str, str]] = []
+    records = iter((out or "").split("\0"))
+    for record in records:
+        kind = record[:1]
+        nfields = _STATUS_V2_FIELDS.get(kind)
+        if nfields is None:
+            continue
+        parts = record.split(" ", nfields)
+        if len(parts) <= nfields:
             continue
-        status = line[:2]
-        rest = line[3:] if len(line) > 3 else ""
-        if " -> " in rest:
-            rest = rest.split(" -> ", 1)[1]
-        rows.append((status, rest.strip()))
+        if kind == "2":
+            next(records, None)  # the rename/copy source path follows as its own record
+        xy = "??" if kind == "?" else "!!" if kind == "!" else parts[1]
+        rows.append((kind, xy, parts[nfields]))
     return rows
 
 
@@ -680,6 +1096,7 @@ def _wait_for_worktree_quiet(
 ) -> None:
     if debounce_seconds <= 0:
         return
+    base = str(worktree)
     start = time.time()
     while True:
         rows = _git_status_porcelain(worktree)
@@ -690,12 +1107,11 @@ def _wait_for_worktree_quiet(
         for _status, rel in rows:
             if not rel:
                 continue
-            p = (worktree / rel).resolve()
             try:
-                st = p.stat()
-            except FileNotFoundError:
+                st = os.stat(os.path.join(base, rel), follow_symlinks=False)
+            except (FileNotFoundError, NotADirectoryError):
                 continue
-            if not p.is_file():
+            if not stat.S_ISREG(st.st_mode):
                 continue
             latest_mtime = max(latest_mtime, st.st_mtime)
 
@@ -725,7 +1141,7 @@ def _hook_commit_msg(args: argparse.Namespace) -> int:
     except FileNotFoundError:
         return 0
 
-    if re.search(r"(?mi)^Agent:\\s*\\S+", text) and re.search(r"(?mi)^Task:\\s*\\S+", text):
+    if _RE_AGENT_HDR.search(text) and _RE_TASK_HDR.search(text):
         return 0
 
     out = text
@@ -757,7 +1173,7 @@ def _hook_pre_commit(_args: argparse.Namespace) -> int:
             task_path = (root / task_path).resolve()
         if not task_path.exists():
             raise HydraError(f"Task file not found: {task_path}")
-        data = json.loads(task_path.read_text(encoding="utf-8"))
+        data = _json_loads(task_path.read_bytes())
         allow = data.get("allow")
         if not isinstance(allow, list) or not all(isinstance(x, str) for x in allow):
             raise HydraError(f"Invalid task allow list in {task_path}")
@@ -770,7 +1186,8 @@ def _hook_pre_commit(_args: argparse.Namespace) -> int:
     if not staged:
         return 0
 
-    not_allowed = [p for p in staged if not _path_is_allowed(p, allow_patterns)]
+    allow_re = _compile_allow(allow_patterns)
+    not_allowed = [p for p in staged if not allow_re.match(p.replace("\\", "/"))]
     if not_allowed:
         pretty = "\n".join([f"- {p}" for p in not_allowed[:50]])
         more = "" if len(not_allowed) <= 50 else f"\n... and {len(not_allowed) - 50} more"
@@ -781,26 +1198,30 @@ def _hook_pre_commit(_args: argparse.Namespace) -> int:
         raise HydraError(f"Locks DB not found: {db_path}. Did you run `hydra init`?")
 
     now = _now_ts()
-    with sqlite3.connect(str(db_path)) as conn:
-        conn.execute("PRAGMA foreign_keys=ON;")
+    with _connect_db(hydra_dir) as conn:
         conn.execute("BEGIN IMMEDIATE;")
         try:
-            conflicts: List[Tuple[str, str, str]] = []
-            for rel in staged:
-                row = conn.execute("SELECT agent, task FROM locks WHERE file=?", (rel,)).fetchone()
-                if row is None:
-                    conn.execute(
-                        "INSERT INTO locks(file, agent, task, locked_at, tmux_session) VALUES(?,?,?,?,?)",
-                        (rel, agent, task_id, now, ""),
-                    )
-                    continue
-                locked_agent, locked_task = str(row[0]), str(row[1])
-                if locked_agent != agent or locked_task != task_id:
-                    conflicts.append((rel, locked_agent, locked_task))
+            held: Dict[str, Tuple[str, str]] = {}
+            for chunk in _chunks(staged, SQL_IN_CHUNK):
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT file, agent, task FROM locks WHERE file IN ({placeholders})", chunk
+                ).fetchall()
+                for f, a, t in rows:
+                    held[str(f)] = (str(a), str(t))
+            conflicts = [
+                (rel, held[rel][0], held[rel][1])
+                for rel in staged
+                if rel in held and held[rel] != (agent, task_id)
+            ]
             if conflicts:
                 pretty = "\n".join([f"- {f} (held by {a}/{t})" for (f, a, t) in conflicts[:50]])
                 more = "" if len(conflicts) <= 50 else f"\n... and {len(conflicts) - 50} more"
                 raise HydraError(f"Pre-commit blocked: lock conflict(s):\n{pretty}{more}")
+            conn.executemany(
+                "INSERT OR IGNORE INTO locks(file, agent, task, locked_at, tmux_session) VALUES(?,?,?,?,?)",
+                ((rel, agent, task_id, now, "") for rel in staged if rel not in held),
+            )
             conn.commit()
         except Exception:
             conn.rollback()
@@ -808,28 +1229,57 @@ def _hook_pre_commit(_args: argparse.Namespace) -> int:
     return 0
 
 
+def _journal_index_path(path: Path) -> Path:
+    return path.with_suffix(".idx")
+
+
 def _append_journal_jsonl(path: Path, obj: Dict[str, object]) -> None:
+    # A single O_APPEND write of one short line is atomic with respect to other
+    # appenders, so no file lock is taken unless the line is unusually long.
+    # fsync is opt-in (HYDRA_JOURNAL_FSYNC=1): the journal is an audit log, not
+    # the source of truth (git is).
     path.parent.mkdir(parents=True, exist_ok=True)
-    line = json.dumps(obj, ensure_ascii=False) + "\n"
-    with path.open("a", encoding="utf-8") as f:
+    data = _json_dumps_bytes(obj) + b"\n"
+    fsync = bool(os.environ.get("HYDRA_JOURNAL_FSYNC", "").strip())
+    try:
+        ts = int(obj.get("ts") or 0)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        ts = 0
+    idx_path = _journal_index_path(path)
+
+    with _JOURNAL_LOCK:
+        fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
         try:
-            import fcntl  # type: ignore
+            if len(data) >= JOURNAL_ATOMIC_WRITE and fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+            offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+            if fsync:
+                os.fsync(fd)
+        finally:
+            # Closing the fd also releases the flock, if one was taken.
+            os.close(fd)
 
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-        except Exception:
-            pass
-        f.write(line)
-        f.flush()
         try:
-            os.fsync(f.fileno())
-        except Exception:
-            pass
+            idx_size = os.stat(idx_path).st_size
+        except FileNotFoundError:
+            idx_size = 0
+        if idx_size < JOURNAL_INDEX_HEADER.size:
+            # New journal, or one that predates the index: (re)build it, which
+            # also covers the line just written.
+            _rebuild_journal_index(path)
+            return
+        rec = JOURNAL_INDEX_RECORD.size
+        fd = os.open(str(idx_path), os.O_RDWR | os.O_APPEND)
         try:
-            import fcntl  # type: ignore
-
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        except Exception:
-            pass
+            last_ts = 0
+            if idx_size >= JOURNAL_INDEX_HEADER.size + rec:
+                last_ts = JOURNAL_INDEX_RECORD.unpack(os.pread(fd, rec, idx_size - rec))[0]
+            os.write(fd, JOURNAL_INDEX_RECORD.pack(max(ts & 0xFFFFFFFF, last_ts), offset))
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
 
 
 @dataclass(frozen=True)
@@ -842,6 +1292,7 @@ class JournalEntry:
     index: int
 
 
+@functools.lru_cache(maxsize=1024)
 def _format_ts_local(ts: int) -> str:
     try:
         return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(ts)))
@@ -855,44 +1306,16 @@ def _parse_duration_seconds(text: str) -> Optional[int]:
         return None
     if s.endswith("ago"):
         s = s[: -len("ago")].strip()
-    units = {
-        "s": 1,
-        "sec": 1,
-        "secs": 1,
-        "second": 1,
-        "seconds": 1,
-        "m": 60,
-        "min": 60,
-        "mins": 60,
-        "minute": 60,
-        "minutes": 60,
-        "h": 3600,
-        "hr": 3600,
-        "hrs": 3600,
-        "hour": 3600,
-        "hours": 3600,
-        "d": 86400,
-        "day": 86400,
-        "days": 86400,
-        "w": 604800,
-        "week": 604800,
-        "weeks": 604800,
-    }
-    total = 0.0
-    pattern = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)")
-    pos = 0
-    for m in pattern.finditer(s):
-        if s[pos : m.start()].strip():
-            return None
-        pos = m.end()
-        num = float(m.group(1))
-        unit = m.group(2)
-        mult = units.get(unit)
+    if not s:
+        return 0
+    if not _RE_DUR_FULL.fullmatch(s):
+        return None
+    total = 0
+    for num, unit in _RE_DUR.findall(s):
+        mult = _UNIT_SECS.get(unit)
         if mult is None:
             return None
-        total += num * mult
-    if s[pos:].strip():
-        return None
+        total += float(num) * mult if "." in num else int(num) * mult
     return int(total)
 
 
@@ -917,7 +1340,7 @@ def _parse_since_to_ts(value: str, *, now_ts: Optional[int] = None) -> int:
     s = (value or "").strip()
     if not s:
         raise HydraError("Empty --since value.")
-    if re.fullmatch(r"\d+", s):
+    if s.isascii() and s.isdigit():
         return int(s)
     now = _now_ts() if now_ts is None else int(now_ts)
     delta = _parse_duration_seconds(s)
@@ -931,67 +1354,185 @@ def _parse_since_to_ts(value: str, *, now_ts: Optional[int] = None) -> int:
     )
 
 
+def _parse_journal_line(raw: bytes, idx: int) -> JournalEntry:
+    """Parse one journal line; raises ValueError for lines that are not valid entries."""
+    try:
+        obj = _json_loads(raw)
+    except ValueError:  # JSONDecodeError, or UnicodeDecodeError from stdlib json
+        raise ValueError("invalid json") from None
+    if not isinstance(obj, dict):
+        raise ValueError("not an object")
+    try:
+        ts = int(obj.get("ts") or 0)
+        sha = str(obj.get("sha") or "")
+        agent = str(obj.get("agent") or "")
+        task = str(obj.get("task") or "")
+        files = str(obj.get("files") or "")
+    except Exception:
+        raise ValueError("invalid fields") from None
+    return JournalEntry(ts=ts, sha=sha, agent=agent, task=task, files=files, index=idx)
+
+
+def _read_journal_lines(f: Iterable[bytes], *, start_index: int = 0) -> Tuple[List[JournalEntry], int]:
+    entries: List[JournalEntry] = []
+    invalid = 0
+    for idx, raw in enumerate(f, start_index):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            entries.append(_parse_journal_line(line, idx))
+        except ValueError:
+            invalid += 1
+    return entries, invalid
+
+
 def _read_journal_entries(path: Path) -> Tuple[List[JournalEntry], int]:
     if not path.exists():
         return [], 0
-    entries: List[JournalEntry] = []
-    invalid = 0
-    with path.open("r", encoding="utf-8", errors="replace") as f:
-        for idx, raw in enumerate(f):
+    with path.open("rb") as f:
+        return _read_journal_lines(f)
+
+
+def _rebuild_journal_index(path: Path) -> None:
+    """Rewrite `journal.idx` from scratch by scanning `journal.jsonl`."""
+    idx_path = _journal_index_path(path)
+    records: List[bytes] = []
+    offset = 0
+    max_ts = 0
+    with path.open("rb") as f:
+        records.append(JOURNAL_INDEX_HEADER.pack(JOURNAL_INDEX_MAGIC, os.fstat(f.fileno()).st_ino))
+        for raw in f:
             line = raw.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                invalid += 1
-                continue
-            if not isinstance(obj, dict):
-                invalid += 1
-                continue
-            try:
-                ts = int(obj.get("ts") or 0)
-                sha = str(obj.get("sha") or "")
-                agent = str(obj.get("agent") or "")
-                task = str(obj.get("task") or "")
-                files = str(obj.get("files") or "")
-            except Exception:
-                invalid += 1
-                continue
-            entries.append(JournalEntry(ts=ts, sha=sha, agent=agent, task=task, files=files, index=idx))
-    return entries, invalid
+            if line:
+                try:
+                    ts = _parse_journal_line(line, 0).ts
+                except ValueError:
+                    ts = None
+                if ts is not None:
+                    max_ts = max(max_ts, ts & 0xFFFFFFFF)
+                    records.append(JOURNAL_INDEX_RECORD.pack(max_ts, offset))
+            offset += len(raw)
+    tmp = idx_path.with_suffix(f".idx.{os.getpid()}.tmp")
+    tmp.write_bytes(b"".join(records))
+    os.replace(tmp, idx_path)
+
+
+def _journal_seek_offset(path: Path, since_ts: int) -> Optional[int]:
+    """
+    Return the byte offset of the first journal line that may have `ts >= since_ts`,
+    using the `journal.idx` sidecar. Returns None when the index is missing or stale.
+    """
+    idx_path = _journal_index_path(path)
+    try:
+        idx_size = idx_path.stat().st_size
+        journal_st = path.stat()
+    except FileNotFoundError:
+        return None
+    hdr, rec = JOURNAL_INDEX_HEADER.size, JOURNAL_INDEX_RECORD.size
+    if idx_size < hdr or (idx_size - hdr) % rec:
+        return None
+    n = (idx_size - hdr) // rec
+    with idx_path.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, ino = JOURNAL_INDEX_HEADER.unpack_from(mm, 0)
+            if magic != JOURNAL_INDEX_MAGIC or ino != journal_st.st_ino:
+                return None  # older format, or the journal was replaced
+            if n == 0:
+                return 0 if journal_st.st_size == 0 else None
+            last_offset = JOURNAL_INDEX_RECORD.unpack_from(mm, hdr + (n - 1) * rec)[1]
+            if last_offset >= journal_st.st_size:
+                return None
+            if last_offset:
+                # A journal truncated and rewritten in place keeps its inode;
+                # the last indexed line must still start right after a newline.
+                with path.open("rb") as jf:
+                    jf.seek(last_offset - 1)
+                    if jf.read(1) != b"\n":
+                        return None
+            target = since_ts - JOURNAL_SEEK_SLACK
+            lo, hi = 0, n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if JOURNAL_INDEX_RECORD.unpack_from(mm, hdr + mid * rec)[0] < target:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == n:
+                # Nothing indexed is recent enough; only unindexed trailing lines remain.
+                return last_offset
+            # Concurrent writers may append index records slightly out of offset
+            # order, so start from the smallest offset among the candidates.
+            return min(JOURNAL_INDEX_RECORD.unpack_from(mm, hdr + i * rec)[1] for i in range(lo, n))
+
+
+def _read_journal_entries_since(path: Path, since_ts: int) -> Tuple[List[JournalEntry], int]:
+    """
+    Like `_read_journal_entries`, but only parses lines at or after the first
+    entry with `ts >= since_ts` (located by binary search over `journal.idx`).
+    """
+    if not path.exists():
+        return [], 0
+    offset = _journal_seek_offset(path, since_ts)
+    if offset is None:
+        entries, invalid = _read_journal_entries(path)
+        try:
+            _rebuild_journal_index(path)
+        except OSError:
+            pass
+        return entries, invalid
+    with path.open("rb") as f:
+        f.seek(offset)
+        return _read_journal_lines(f)
 
 
 def _format_journal_files(files: str) -> str:
+    # `files` is produced by the post-commit hook: ';'-joined diff-tree lines,
+    # already stripped, with tab-separated columns.
     parts: List[str] = []
     for raw in (files or "").split(";"):
-        raw = raw.strip()
         if not raw:
             continue
-        cols = [c for c in raw.split("\t") if c != ""]
-        status = cols[0].strip() if cols else ""
-        paths = [c.strip() for c in cols[1:] if c.strip()]
+        status, *paths = raw.split("\t")
         if not status:
             continue
-        if status.startswith(("R", "C")) and len(paths) >= 2:
+        if status[:1] in "RC" and len(paths) >= 2:
             parts.append(f"{status} {paths[0]} -> {paths[1]}")
         elif paths:
-            if len(paths) == 1:
-                parts.append(f"{status} {paths[0]}")
-            else:
-                parts.append(f"{status} {' '.join(paths)}")
+            parts.append(f"{status} {' '.join(paths)}")
         else:
             parts.append(status)
     return "; ".join(parts)
 
 
+def _diff_tree_name_status(rev: str) -> str:
+    # Stream diff-tree rather than capturing it whole: large merges can touch
+    # thousands of paths and we only need the ';'-joined form.
+    argv = ["git", "diff-tree", "--no-commit-id", "--name-status", "-r", rev]
+    parts: List[str] = []
+    with subprocess.Popen(
+        [_resolve_exe(argv[0]), "-C", _cwd(), *argv[1:]], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, close_fds=False
+    ) as proc:  # nosec - CLI tool by design
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            line = line.strip()
+            if line:
+                parts.append(line)
+        stderr = proc.stderr.read() if proc.stderr else ""
+    if proc.returncode != 0:
+        msg = f"Command failed ({proc.returncode}): {' '.join(argv)}"
+        if stderr.strip():
+            msg += f"\nSTDERR:\n{stderr.strip()}"
+        raise HydraError(msg)
+    return ";".join(parts)
+
+
 def _hook_post_commit(_args: argparse.Namespace) -> int:
     root = _find_hydra_root_for_hooks()
     hydra_dir, _agents_dir, _tasks_dir = _ensure_dirs(root)
 
     sha = _run(["git", "rev-parse", "HEAD"], capture=True).stdout.strip()
-    files_out = _run(["git", "diff-tree", "--no-commit-id", "--name-status", "-r", "HEAD"], capture=True).stdout
-    files = ";".join([line.strip() for line in (files_out or "").splitlines() if line.strip()])
+    files = _diff_tree_name_status("HEAD")
 
     agent = os.environ.get("AGENT_ID", "").strip()
     task = os.environ.get("TASK_ID", "").strip()
@@ -1010,36 +1551,70 @@ def cmd_hook(args: argparse.Namespace) -> int:
     raise HydraError(f"Unknown hook command: {args.hook_cmd}")
 
 
-def _tmux_session_exists(session: str) -> bool:
-    if not _tmux_available():
-        return False
+def _tmux_live_sessions() -> Optional[set]:
+    """Names of running tmux sessions, or None when tmux is not installed."""
     try:
-        proc = subprocess.run(  # nosec - CLI tool by design
-            ["tmux", "has-session", "-t", session],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        return set(_tmux_list_sessions())
     except FileNotFoundError:
-        return False
-    return proc.returncode == 0
+        return None
 
 
-def _cleanup_dead_locks(conn: sqlite3.Connection) -> int:
-    if not _tmux_available():
+DEAD_LOCK_CLEANUP_INTERVAL = 5
+
+
+def _cleanup_dead_locks(conn: sqlite3.Connection, *, force: bool = False) -> int:
+    now = _now_ts()
+    if not force:
+        row = conn.execute("SELECT value FROM meta WHERE key='last_dead_lock_cleanup'").fetchone()
+        try:
+            if row is not None and now - int(row[0]) < DEAD_LOCK_CLEANUP_INTERVAL:
+                return 0
+        except (TypeError, ValueError):
+            pass
+    live = _tmux_live_sessions()
+    if live is None:
         return 0
     rows = conn.execute(
         "SELECT DISTINCT tmux_session FROM locks WHERE tmux_session IS NOT NULL AND tmux_session != ''"
     ).fetchall()
+    dead = [str(session) for (session,) in rows if session not in live]
     released = 0
-    for (session,) in rows:
-        if not session:
-            continue
-        if _tmux_session_exists(session):
-            continue
-        released += conn.execute("DELETE FROM locks WHERE tmux_session=?", (session,)).rowcount
+    for chunk in _chunks(dead, SQL_IN_CHUNK):
+        placeholders = ",".join("?" * len(chunk))
+        released += conn.execute(f"DELETE FROM locks WHERE tmux_session IN ({placeholders})", chunk).rowcount
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('last_dead_lock_cleanup', ?)", (str(now),))
     return released
 
 
+def _lock_conflicts(
+    conn: sqlite3.Connection, files: Sequence[str], *, agent: str, task: str, limit: int
+) -> Tuple[List[Tuple[str, str, str]], int]:
+    """
+    Return up to `limit` (file, agent, task) rows for `files` held by someone other
+    than agent/task, plus the total number of such rows.
+    """
+    conflicts: List[Tuple[str, str, str]] = []
+    for chunk in _chunks(files, SQL_IN_CHUNK):
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT file, agent, task FROM locks WHERE file IN ({placeholders}) AND (agent<>? OR task<>?) LIMIT ?",
+            (*chunk, agent, task, limit + 1 - len(conflicts)),
+        ).fetchall()
+        conflicts.extend((str(f), str(a), str(t)) for (f, a, t) in rows)
+        if len(conflicts) > limit:
+            break
+    if len(conflicts) <= limit:
+        return conflicts, len(conflicts)
+    total = 0
+    for chunk in _chunks(files, SQL_IN_CHUNK):
+        placeholders = ",".join("?" * len(chunk))
+        total += conn.execute(
+            f"SELECT COUNT(*) FROM locks WHERE file IN ({placeholders}) AND (agent<>? OR task<>?)",
+            (*chunk, agent, task),
+        ).fetchone()[0]
+    return conflicts[:limit], total
+
+
 def _acquire_locks(
     conn: sqlite3.Connection,
     *,
@@ -1054,43 +1629,19 @@ def _acquire_locks(
     try:
         _cleanup_dead_locks(conn)
         if unique:
-            placeholders = ",".join("?" for _ in unique)
-            rows = conn.execute(
-                f"SELECT file, agent, task FROM locks WHERE file IN ({placeholders})",
-                tuple(unique),
-            ).fetchall()
-            conflicts = [(f, a, t) for (f, a, t) in rows if (a != agent or t != task)]
+            conflicts, total = _lock_conflicts(conn, unique, agent=agent, task=task, limit=20)
             if conflicts:
-                pretty = "\n".join([f"- {f} (held by {a} / {t})" for (f, a, t) in conflicts[:20]])
-                more = "" if len(conflicts) <= 20 else f"\n... and {len(conflicts) - 20} more"
+                pretty = "\n".join([f"- {f} (held by {a} / {t})" for (f, a, t) in conflicts])
+                more = "" if total <= 20 else f"\n... and {total - 20} more"
                 raise MctlError(f"Lock conflict for agent={agent} task={task}:\n{pretty}{more}")
 
-            for f in unique:
-                try:
-                    conn.execute(
-                        "INSERT INTO locks(file, agent, task, locked_at, tmux_session) VALUES(?,?,?,?,?)",
-                        (f, agent, task, now, tmux_session),
-                    )
-                except sqlite3.IntegrityError:
-                    conn.execute(
-                        "UPDATE locks SET agent=?, task=?, locked_at=?, tmux_session=? WHERE file=?",
-                        (agent, task, now, tmux_session, f),
-                    )
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-
-
-def _set_locks_tmux_session(conn: sqlite3.Connection, *, agent: str, task: str, tmux_session: str) -> int:
-    conn.execute("BEGIN IMMEDIATE;")
-    try:
-        updated = conn.execute(
-            "UPDATE locks SET tmux_session=? WHERE agent=? AND task=?",
-            (tmux_session, agent, task),
-        ).rowcount
+            conn.executemany(
+                "INSERT INTO locks(file, agent, task, locked_at, tmux_session) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(file) DO UPDATE SET agent=excluded.agent, task=excluded.task, "
+                "locked_at=excluded.locked_at, tmux_session=excluded.tmux_session",
+                ((f, agent, task, now, tmux_session) for f in unique),
+            )
         conn.commit()
-        return updated
     except Exception:
         conn.rollback()
         raise
@@ -1108,10 +1659,11 @@ def _release_locks(conn: sqlite3.Connection, *, agent: str, task: str) -> int:
 
 
 def _list_locks(conn: sqlite3.Connection) -> List[Tuple[str, str, str, int, str]]:
-    rows = conn.execute(
-        "SELECT file, agent, task, locked_at, COALESCE(tmux_session, '') FROM locks ORDER BY file"
+    # Casts in SQL give the declared Python types without a per-row pass.
+    return conn.execute(
+        "SELECT CAST(file AS TEXT), CAST(agent AS TEXT), CAST(task AS TEXT), CAST(locked_at AS INTEGER), "
+        "CAST(COALESCE(tmux_session, '') AS TEXT) FROM locks ORDER BY file"
     ).fetchall()
-    return [(str(f), str(a), str(t), int(ts), str(s)) for (f, a, t, ts, s) in rows]
 
 
 @dataclass(frozen=True)
@@ -1126,12 +1678,31 @@ def _task_path(tasks_dir: Path, task_id: str) -> Path:
     return tasks_dir / f"{task_id}.json"
 
 
+@functools.lru_cache(maxsize=64)
+def _agent_env(agent: str, task_id: str, root: Path, tasks_dir: Path) -> Mapping[str, str]:
+    """Identity variables exported to an agent's shell and its git commits."""
+    name = f"{agent} Agent"
+    email = f"{agent}@agents.local"
+    return MappingProxyType(
+        {
+            "AGENT_ID": agent,
+            "TASK_ID": task_id,
+            "HYDRA_PROJECT_ROOT": str(root),
+            "HYDRA_TASK_FILE": str(_task_path(tasks_dir, task_id)),
+            "GIT_AUTHOR_NAME": name,
+            "GIT_AUTHOR_EMAIL": email,
+            "GIT_COMMITTER_NAME": name,
+            "GIT_COMMITTER_EMAIL": email,
+        }
+    )
+
+
 def _load_task(tasks_dir: Path, task_id: str) -> Task:
     task_id = _sanitize_task_id(task_id)
     path = _task_path(tasks_dir, task_id)
     if not path.exists():
         raise MctlError(f"Task not found: {task_id} ({path})")
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = _json_loads(path.read_bytes())
     if data.get("id") != task_id:
         raise MctlError(f"Task file id mismatch: expected {task_id}, got {data.get('id')!r}")
     allow = data.get("allow")
@@ -1172,21 +1743,31 @@ def _create_task(tasks_dir: Path, *, title: str, allow: Sequence[str], explicit_
         "allow": [_validate_allow_pattern(x) for x in allow],
         "created": created,
     }
-    path.write_text(json.dumps(task, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    path.write_bytes(_json_dumps_bytes(task, indent=True) + b"\n")
     return Task(id=task_id, title=title, allow=list(task["allow"]), created=created)
 
 
-def _default_base_ref(root: Path) -> str:
-    for candidate in ("main", "master"):
-        proc = subprocess.run(  # nosec - CLI tool by design
-            ["git", "show-ref", "--verify", "--quiet", f"refs/heads/{candidate}"],
-            cwd=str(root),
-        )
-        if proc.returncode == 0:
-            return candidate
+def _trunk_candidates(root: Path) -> List[str]:
+    # One for-each-ref instead of a show-ref per candidate; output is sorted by
+    # refname, so "main" wins over "master" when both exist. The patterns also
+    # match below a slash (refs/heads/main/foo), so keep exact refs only.
+    out = _git(root, ["for-each-ref", "--format=%(refname)", "refs/heads/main", "refs/heads/master"]).stdout
+    return [line[len("refs/heads/"):] for line in out.splitlines() if line in ("refs/heads/main", "refs/heads/master")]
+
+
+@functools.lru_cache(maxsize=8)
+def _default_base_ref_cached(root_key: str) -> str:
+    root = Path(root_key)
+    candidates = _trunk_candidates(root)
+    if candidates:
+        return candidates[0]
     return _git(root, ["rev-parse", "--abbrev-ref", "HEAD"]).stdout.strip() or "HEAD"
 
 
+def _default_base_ref(root: Path) -> str:
+    return _default_base_ref_cached(str(root))
+
+
 def _create_worktree(
     root: Path,
     *,
@@ -1199,16 +1780,12 @@ def _create_worktree(
         raise MctlError(f"Worktree path already exists: {worktree}")
     worktree.parent.mkdir(parents=True, exist_ok=True)
 
-    proc = subprocess.run(  # nosec - CLI tool by design
-        ["git", "show-ref", "--verify", "--quiet", f"refs/heads/{branch}"],
-        cwd=str(root),
-    )
-    if proc.returncode == 0:
+    if _git_ref_exists(root, f"refs/heads/{branch}"):
         raise MctlError(f"Branch already exists: {branch}")
 
     cmd = ["git", "worktree", "add", "-b", branch, str(worktree), base_ref]
     if dry_run:
-        print("[dry-run]", " ".join(cmd))
+        print("[dry-run]", " ".join(cmd), file=_stdout())
         return
     _run(cmd, cwd=root, capture=True)
 
@@ -1216,7 +1793,7 @@ def _create_worktree(
 def _relative_symlink(target: Path, dest: Path, *, dry_run: bool) -> None:
     rel = os.path.relpath(str(target), str(dest.parent))
     if dry_run:
-        print(f"[dry-run] ln -s {rel} {dest}")
+        print(f"[dry-run] ln -s {rel} {dest}", file=_stdout())
         return
     dest.symlink_to(rel)
 
@@ -1228,8 +1805,17 @@ def _share_deps(root: Path, worktree: Path, deps: Sequence[str], *, dry_run: boo
         if not src.exists():
             continue
         dest = worktree / d
-        if dest.exists() or dest.is_symlink():
-            if dest.is_symlink():
+        try:
+            st = os.lstat(dest)
+        except FileNotFoundError:
+            st = None
+        if st is not None:
+            if stat.S_ISLNK(st.st_mode):
+                # Our own links are relative; compare the link text before paying
+                # for two realpath walks.
+                if os.readlink(dest) == os.path.relpath(str(src), str(dest.parent)):
+                    shared.append(d)
+                    continue
                 try:
                     if dest.resolve() == src.resolve():
                         shared.append(d)
@@ -1244,50 +1830,60 @@ def _share_deps(root: Path, worktree: Path, deps: Sequence[str], *, dry_run: boo
 
 def _tmux_session_name(agent: str, task: str) -> str:
     # tmux session names can't contain ':'; keep it simple and stable.
-    a = re.sub(r"[^A-Za-z0-9._-]+", "-", agent).strip("-")
-    t = re.sub(r"[^A-Za-z0-9._-]+", "-", task).strip("-")
+    a = _scrub_unsafe(agent)
+    t = _scrub_unsafe(task)
     name = f"hydra-{a}-{t}"
     return name[:60]  # tmux has practical limits; keep it short
 
 
+_TMUX_WINDOWS: Dict[str, set] = {}
+
+
+def _tmux_window_names(session: str) -> set:
+    names = _TMUX_WINDOWS.get(session)
+    if names is None:
+        result = _fast_run(["tmux", "list-windows", "-t", session, "-F", "#{window_name}"])
+        names = set(result.stdout.split("\n")) - {""} if result.returncode == 0 else set()
+        _TMUX_WINDOWS[session] = names
+    return names
+
+
 def _start_tmux_window(
     *,
     project_session: str,
     window_name: str,
     worktree: Path,
-    env_vars: Dict[str, str],
+    env_vars: Mapping[str, str],
     shell: str,
     dry_run: bool,
 ) -> None:
     """Create a new window in the project's tmux session."""
-    # Check if window already exists
-    result = subprocess.run(
-        ["tmux", "list-windows", "-t", project_session, "-F", "#{window_name}"],
-        capture_output=True,
-        text=True,
-    )
-    existing_windows = result.stdout.strip().split("\n") if result.stdout.strip() else []
+    # tmux happily creates duplicate window names, so a failed new-window can't
+    # tell us about collisions; check against a per-invocation listing instead.
+    existing_windows = _tmux_window_names(project_session)
     if window_name in existing_windows:
         raise MctlError(f"tmux window already exists: {window_name} in session {project_session}")
 
     if dry_run:
-        print(f"[dry-run] tmux new-window -t {project_session} -n {window_name} -c {worktree}")
+        print(f"[dry-run] tmux new-window -t {project_session} -n {window_name} -c {worktree}", file=_stdout())
         return
     
-    # Create window with shell
-    subprocess.run(
-        ["tmux", "new-window", "-t", project_session, "-n", window_name, "-c", str(worktree)],
-        check=True,
-        capture_output=True,
-        text=True,
-    )
-    
-    # Set environment variables in the new window
-    for k, v in env_vars.items():
-        subprocess.run(
-            ["tmux", "send-keys", "-t", f"{project_session}:{window_name}", f"export {k}={v}", "Enter"],
+    # Create window with its environment set up front (tmux >= 3.0 supports -e).
+    new_window = ["tmux", "new-window", "-t", project_session, "-n", window_name, "-c", str(worktree)]
+    env_args = [arg for k, v in env_vars.items() for arg in ("-e", f"{k}={v}")]
+    proc = _fast_run([*new_window, *env_args])
+    if proc.returncode == 0:
+        existing_windows.add(window_name)
+        return
+
+    # Older tmux: create the window, then export everything in one send-keys.
+    _fast_run(new_window, check=True)
+    existing_windows.add(window_name)
+    if env_vars:
+        exports = " ".join(f"export {k}={shlex.quote(v)};" for k, v in env_vars.items())
+        _fast_run(
+            ["tmux", "send-keys", "-t", f"{project_session}:{window_name}", exports, "Enter"],
             check=False,
-            capture_output=True,
         )
 
 
@@ -1297,7 +1893,7 @@ def cmd_init(args: argparse.Namespace) -> int:
     _ensure_config(hydra_dir)
     _ensure_zellij_layout(hydra_dir, quiet=False)
     with _connect_db(hydra_dir) as conn:
-        _cleanup_dead_locks(conn)
+        _cleanup_dead_locks(conn, force=True)
     # Hooks disabled - they add complexity without much benefit
     # _install_git_hooks(root)
     _ensure_tmux_session(root, hydra_dir, getattr(args, 'session', None))
@@ -1306,9 +1902,9 @@ def cmd_init(args: argparse.Namespace) -> int:
     claude_md = root / "claude.md"
     if not claude_md.exists():
         claude_md.write_text(CLAUDE_MD_TEMPLATE, encoding="utf-8")
-        print(f"Created {claude_md}")
+        print(f"Created {claude_md}", file=_stdout())
 
-    print(f"Initialized hydra in {root}")
+    print(f"Initialized hydra in {root}", file=_stdout())
     return 0
 
 
@@ -1328,7 +1924,7 @@ def cmd_snapshot(args: argparse.Namespace) -> int:
         agent_dir = agents_dir / agent
         if not agent_dir.exists():
             raise HydraError(f"Agent directory not found: {agent_dir}")
-        candidates = sorted([p.name for p in agent_dir.iterdir() if p.is_dir() and re.fullmatch(r"t[0-9]{6,}", p.name)])
+        candidates = sorted([p.name for p in agent_dir.iterdir() if p.is_dir() and _RE_TASK_DIR.fullmatch(p.name)])
         if not candidates:
             raise HydraError(f"No tasks found under {agent_dir} (expected directories like t1737123456)")
         if len(candidates) != 1:
@@ -1340,7 +1936,7 @@ def cmd_snapshot(args: argparse.Namespace) -> int:
 
     rows = _git_status_porcelain(worktree)
     if not rows:
-        print("No changes")
+        print("No changes", file=_stdout())
         return 0
 
     _wait_for_worktree_quiet(
@@ -1349,28 +1945,16 @@ def cmd_snapshot(args: argparse.Namespace) -> int:
 
     _run(["git", "add", "-A"], cwd=worktree, capture=True)
     if not _git_status_porcelain(worktree):
-        print("No changes")
+        print("No changes", file=_stdout())
         return 0
 
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_now_ts()))
     msg = f"Snapshot: {timestamp}"
 
-    env = os.environ.copy()
-    env.update(
-        {
-            "AGENT_ID": agent,
-            "TASK_ID": task.id,
-            "HYDRA_PROJECT_ROOT": str(root),
-            "HYDRA_TASK_FILE": str(_task_path(tasks_dir, task.id)),
-            "GIT_AUTHOR_NAME": f"{agent} Agent",
-            "GIT_AUTHOR_EMAIL": f"{agent}@agents.local",
-            "GIT_COMMITTER_NAME": f"{agent} Agent",
-            "GIT_COMMITTER_EMAIL": f"{agent}@agents.local",
-        }
-    )
+    env = _env_with(_agent_env(agent, task.id, root, tasks_dir))
     _run(["git", "commit", "-m", msg], cwd=worktree, capture=True, env=env)
     sha = _run(["git", "rev-parse", "HEAD"], cwd=worktree, capture=True, env=env).stdout.strip()
-    print(sha)
+    print(sha, file=_stdout())
     return 0
 
 
@@ -1392,9 +1976,12 @@ def cmd_changes(args: argparse.Namespace) -> int:
         task_filter = _sanitize_task_id(args.task)
 
     journal_path = hydra_dir / "journal.jsonl"
-    entries, invalid = _read_journal_entries(journal_path)
+    if since_ts is not None:
+        entries, invalid = _read_journal_entries_since(journal_path, since_ts)
+    else:
+        entries, invalid = _read_journal_entries(journal_path)
     if invalid:
-        print(f"hydra warning: skipped {invalid} invalid journal line(s) in {journal_path}", file=sys.stderr)
+        print(f"hydra warning: skipped {invalid} invalid journal line(s) in {journal_path}", file=_stderr())
 
     filtered: List[JournalEntry] = []
     for e in entries:
@@ -1415,15 +2002,25 @@ def cmd_changes(args: argparse.Namespace) -> int:
         agent = e.agent or "-"
         task = e.task or "-"
         files = _format_journal_files(e.files)
-        print(f"{ts}\t{agent}\t{task}\t{e.sha}\t{files}")
+        print(f"{ts}\t{agent}\t{task}\t{e.sha}\t{files}", file=_stdout())
     return 0
 
 
 def _git_ref_exists(root: Path, ref: str) -> bool:
-    proc = subprocess.run(  # nosec - CLI tool by design
-        ["git", "show-ref", "--verify", "--quiet", ref],
-        cwd=str(root),
-    )
+    # With the files ref backend a ref is either a loose file or a packed-refs
+    # line, so answer from the filesystem; anything else goes through git.
+    git_dir = root / ".git"
+    if ref.startswith("refs/") and git_dir.is_dir() and not (git_dir / "reftable").exists():
+        if (git_dir / ref).is_file():
+            return True
+        try:
+            with open(git_dir / "packed-refs", "rb") as f:
+                packed = f.read()
+        except FileNotFoundError:
+            return False
+        needle = b" " + os.fsencode(ref)
+        return packed.endswith(needle) or needle + b"\n" in packed
+    proc = _fast_run(["git", "show-ref", "--verify", "--quiet", ref], cwd=root)
     return proc.returncode == 0
 
 
@@ -1436,50 +2033,55 @@ class GitWorktree:
 def _list_git_worktrees(root: Path) -> List[GitWorktree]:
     out = _run(["git", "worktree", "list", "--porcelain"], cwd=root, capture=True).stdout
     items: List[GitWorktree] = []
-    cur_path: Optional[Path] = None
-    cur_branch = ""
-    for raw in (out or "").splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line.startswith("worktree "):
-            if cur_path is not None:
-                items.append(GitWorktree(path=cur_path, branch_ref=cur_branch))
-            cur_path = Path(line.split(" ", 1)[1]).expanduser().resolve()
-            cur_branch = ""
-            continue
-        if line.startswith("branch "):
-            cur_branch = line.split(" ", 1)[1].strip()
-            continue
-    if cur_path is not None:
-        items.append(GitWorktree(path=cur_path, branch_ref=cur_branch))
+    # Records are separated by blank lines; each line is "<key>[ <value>]".
+    for record in (out or "").strip().split("\n\n"):
+        fields = dict(line.split(" ", 1) for line in record.splitlines() if " " in line)
+        path = fields.get("worktree")
+        if path:
+            # git prints absolute paths; nothing compares them canonically, so no resolve().
+            items.append(GitWorktree(path=Path(path), branch_ref=fields.get("branch", "").strip()))
     return items
 
 
-def _find_worktree_by_branch(root: Path, branch_ref: str) -> Optional[Path]:
-    for wt in _list_git_worktrees(root):
+def _worktree_for_branch(worktrees: Iterable[GitWorktree], branch_ref: str) -> Optional[Path]:
+    for wt in worktrees:
         if wt.branch_ref == branch_ref:
             return wt.path
     return None
 
 
-def _default_trunk_ref(root: Path) -> str:
-    for candidate in ("main", "master"):
-        if _git_ref_exists(root, f"refs/heads/{candidate}"):
-            return candidate
+def _find_worktree_by_branch(root: Path, branch_ref: str) -> Optional[Path]:
+    return _worktree_for_branch(_list_git_worktrees(root), branch_ref)
+
+
+def _git_state_snapshot(root: Path, refs: Sequence[str]) -> Tuple[set, List[GitWorktree]]:
+    """Which of `refs` exist, plus the worktree list: two git calls for the lot."""
+    out = _git(root, ["for-each-ref", "--format=%(refname)", *refs]).stdout
+    existing = set(out.splitlines()) & set(refs)
+    return existing, _list_git_worktrees(root)
+
+
+@functools.lru_cache(maxsize=8)
+def _default_trunk_ref_cached(root_key: str) -> str:
+    candidates = _trunk_candidates(Path(root_key))
+    if candidates:
+        return candidates[0]
     raise HydraError("No trunk branch found (expected refs/heads/main or refs/heads/master).")
 
 
+def _default_trunk_ref(root: Path) -> str:
+    return _default_trunk_ref_cached(str(root))
+
+
 def _ensure_worktree_clean(
     worktree: Path,
     *,
     label: str,
     allow_untracked: bool,
 ) -> None:
-    out = _run(["git", "status", "--porcelain"], cwd=worktree, capture=True).stdout
-    lines = [line.rstrip("\n") for line in (out or "").splitlines() if line.strip()]
-    if allow_untracked:
-        lines = [line for line in lines if not line.startswith("??")]
+    # Porcelain v2 writes an unchanged side as '.'; show the familiar v1 ' M' / 'M ' codes.
+    rows = _git_status_v2(worktree, untracked=not allow_untracked)
+    lines = [f"{xy.replace('.', ' ')} {path}" for _kind, xy, path in rows]
     if not lines:
         return
     preview = "\n".join(lines[:20])
@@ -1487,6 +2089,11 @@ def _ensure_worktree_clean(
     raise HydraError(f"{label} has uncommitted changes in {worktree}:\n{preview}{more}")
 
 
+def _merge_conflict_files(worktree: Path) -> List[str]:
+    """Paths left unmerged by a failed merge (porcelain v2 'u' records), in one pass."""
+    return [path for kind, _xy, path in _git_status_v2(worktree, untracked=False) if kind == "u"]
+
+
 def _abort_merge(worktree: Path) -> None:
     proc = _run(["git", "merge", "--abort"], cwd=worktree, capture=True, check=False)
     if proc.returncode == 0:
@@ -1501,6 +2108,19 @@ def _abort_revert(worktree: Path) -> None:
     _run(["git", "reset", "--hard", "HEAD"], cwd=worktree, capture=True, check=False)
 
 
+def _journal_last_by_task(journal_path: Path, agent: str) -> Dict[str, Tuple[int, str]]:
+    """Map each of `agent`'s tasks to its latest (ts, sha) in the journal, in one pass."""
+    entries, _invalid = _read_journal_entries(journal_path)
+    last_by_task: Dict[str, Tuple[int, str]] = {}
+    for e in entries:
+        if e.agent != agent or not e.task:
+            continue
+        prev = last_by_task.get(e.task)
+        if prev is None or e.ts >= prev[0]:
+            last_by_task[e.task] = (e.ts, e.sha)
+    return last_by_task
+
+
 def _resolve_agent_task(
     *,
     root: Path,
@@ -1517,11 +2137,10 @@ def _resolve_agent_task(
         agent_dir = agents_dir / agent
         if agent_dir.exists():
             tasks = sorted(
-                [p.name for p in agent_dir.iterdir() if p.is_dir() and re.fullmatch(r"t[0-9]{6,}", p.name)]
+                [p.name for p in agent_dir.iterdir() if p.is_dir() and _RE_TASK_DIR.fullmatch(p.name)]
             )
     if not tasks:
-        entries, _invalid = _read_journal_entries(hydra_dir / "journal.jsonl")
-        tasks = sorted({e.task for e in entries if e.agent == agent and e.task})
+        tasks = sorted(_journal_last_by_task(hydra_dir / "journal.jsonl", agent))
 
     if not tasks:
         raise HydraError(f"No tasks found for agent {agent!r}.")
@@ -1539,11 +2158,44 @@ def _rewrite_headish_for_branch(ref: str, *, branch: str) -> str:
     return s
 
 
-def _resolve_commit(root: Path, ref: str) -> str:
-    sha = _run(["git", "rev-parse", "--verify", ref], cwd=root, capture=True).stdout.strip()
-    if not sha:
-        raise HydraError(f"Unable to resolve ref: {ref!r}")
-    return sha
+@contextmanager
+def _git_batcher(root: Path) -> Iterator[Callable[[str], Optional[str]]]:
+    """
+    Yield a resolver backed by one `git cat-file --batch-check` process: each call
+    maps a revision expression to its object id, or None if it does not resolve.
+    """
+    backend = _GIT_BACKEND.get()
+    if backend is not None and Path(backend.root) == root:  # type: ignore[attr-defined]
+        yield backend.resolve  # type: ignore[attr-defined]
+        return
+
+    proc = subprocess.Popen(  # nosec - CLI tool by design
+        [_resolve_exe("git"), "-C", str(root), "cat-file", "--batch-check=%(objectname)"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        close_fds=False,
+    )
+    assert proc.stdin is not None and proc.stdout is not None
+
+    def resolve(rev: str) -> Optional[str]:
+        if not rev or "\n" in rev:
+            return None
+        proc.stdin.write(rev + "\n")
+        proc.stdin.flush()
+        line = proc.stdout.readline().strip()
+        # Unresolvable names come back as "<rev> missing" (or "ambiguous").
+        if not line or " " in line:
+            return None
+        return line
+
+    try:
+        yield resolve
+    finally:
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
 
 
 def _list_changed_files(root: Path, *, base_ref: str, target_ref: str) -> List[str]:
@@ -1555,25 +2207,16 @@ def _list_changed_files(root: Path, *, base_ref: str, target_ref: str) -> List[s
 
 
 def _list_agent_tasks_from_branches(root: Path, agent: str) -> List[str]:
+    prefix = f"refs/heads/agent/{agent}/"
     out = _run(
-        ["git", "for-each-ref", "--format=%(refname:short)", f"refs/heads/agent/{agent}/"],
+        ["git", "for-each-ref", "--sort=refname", "--format=%(refname)", prefix],
         cwd=root,
         capture=True,
         check=True,
     ).stdout
-    tasks: List[str] = []
-    for line in (out or "").splitlines():
-        ref = line.strip()
-        if not ref:
-            continue
-        # agent/<agent>/<task>
-        parts = ref.split("/", 2)
-        if len(parts) != 3:
-            continue
-        task = parts[2]
-        if re.fullmatch(r"t[0-9]{6,}", task):
-            tasks.append(task)
-    return sorted(set(tasks))
+    # Already sorted by git; refs are unique, dict.fromkeys just guards order-preserving dedup.
+    tasks = (line[len(prefix) :] for line in (out or "").splitlines() if line.startswith(prefix))
+    return list(dict.fromkeys(t for t in tasks if _RE_TASK_DIR.fullmatch(t)))
 
 
 def cmd_diff(args: argparse.Namespace) -> int:
@@ -1584,14 +2227,18 @@ def cmd_diff(args: argparse.Namespace) -> int:
     agent = _sanitize_ref_component(args.agent, label="agent name")
     task_filter: Optional[str] = _sanitize_task_id(args.task) if args.task else None
 
+    journal_path = hydra_dir / "journal.jsonl"
+    # Latest journal commit per task; only needed for task discovery or for tasks
+    # whose branch is gone, so it is built on first use.
+    last_by_task: Optional[Dict[str, Tuple[int, str]]] = None
     tasks: List[str] = []
     if task_filter is not None:
         tasks = [task_filter]
     else:
         tasks = _list_agent_tasks_from_branches(root, agent)
         if not tasks:
-            journal_entries, _invalid = _read_journal_entries(hydra_dir / "journal.jsonl")
-            tasks = sorted({e.task for e in journal_entries if e.agent == agent and e.task})
+            last_by_task = _journal_last_by_task(journal_path, agent)
+            tasks = sorted(last_by_task)
         if not tasks:
             agent_dir = agents_dir / agent
             if agent_dir.exists():
@@ -1599,58 +2246,54 @@ def cmd_diff(args: argparse.Namespace) -> int:
                     [
                         p.name
                         for p in agent_dir.iterdir()
-                        if p.is_dir() and re.fullmatch(r"t[0-9]{6,}", p.name)
+                        if p.is_dir() and _RE_TASK_DIR.fullmatch(p.name)
                     ]
                 )
 
     if not tasks:
         raise HydraError(f"No tasks found for agent {agent!r}.")
 
-    journal_entries, _invalid = _read_journal_entries(hydra_dir / "journal.jsonl")
-    last_by_task: Dict[str, Tuple[int, str]] = {}
-    for e in journal_entries:
-        if e.agent != agent or not e.task:
-            continue
-        if task_filter is not None and e.task != task_filter:
-            continue
-        prev = last_by_task.get(e.task)
-        if prev is None or int(e.ts) >= int(prev[0]):
-            last_by_task[e.task] = (int(e.ts), e.sha)
-
     base_ref = _default_base_ref(root)
     multi = len(tasks) > 1
     printed_any = False
 
-    for task in tasks:
-        branch = f"agent/{agent}/{task}"
-        if _git_ref_exists(root, f"refs/heads/{branch}"):
-            target_ref = branch
+    branch_refs = [f"refs/heads/agent/{agent}/{task}" for task in tasks]
+    existing_refs = set(_git(root, ["for-each-ref", "--format=%(refname)", *branch_refs]).stdout.splitlines())
+    targets: List[Tuple[str, str]] = []
+    for task, branch_ref in zip(tasks, branch_refs):
+        if branch_ref in existing_refs:
+            target_ref = f"agent/{agent}/{task}"
         else:
+            if last_by_task is None:
+                last_by_task = _journal_last_by_task(journal_path, agent)
             last = last_by_task.get(task)
             if last is None or not last[1]:
                 raise HydraError(f"Cannot find branch or journal commit for {agent}/{task}.")
             target_ref = last[1]
-
-        merge_base = _run(["git", "merge-base", base_ref, target_ref], cwd=root, capture=True, check=True).stdout.strip()
-        if not merge_base:
-            raise HydraError(f"Unable to find merge-base between {base_ref!r} and {target_ref!r}.")
-
-        if multi:
-            print(f"=== diff {agent}/{task} ({base_ref}..{target_ref}) ===", file=sys.stderr)
-
-        proc = _run(["git", "diff", f"{merge_base}..{target_ref}"], cwd=root, capture=True, check=True)
-        out = proc.stdout or ""
-        if out:
-            sys.stdout.write(out)
-            if not out.endswith("\n"):
-                sys.stdout.write("\n")
-            printed_any = True
-        elif multi:
-            print("(no diff)", file=sys.stderr)
+        targets.append((task, target_ref))
+
+    def diff_for(target_ref: str) -> str:
+        # `base...target` diffs against the merge-base, so no separate merge-base call.
+        return _run(["git", "diff", f"{base_ref}...{target_ref}"], cwd=root, capture=True, check=True).stdout or ""
+
+    # Diffs are independent git processes; run them concurrently but write the
+    # output from this thread, in task order.
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(targets)))) as pool:
+        outputs = pool.map(diff_for, [target_ref for _task, target_ref in targets])
+        for (task, target_ref), out in zip(targets, outputs):
+            if multi:
+                print(f"=== diff {agent}/{task} ({base_ref}..{target_ref}) ===", file=_stderr())
+            if out:
+                _stdout().write(out)
+                if not out.endswith("\n"):
+                    _stdout().write("\n")
+                printed_any = True
+            elif multi:
+                print("(no diff)", file=_stderr())
 
     if not printed_any and not multi:
         # Single task and no diff; keep output explicit.
-        print("No diff")
+        print("No diff", file=_stdout())
     return 0
 
 
@@ -1667,28 +2310,25 @@ def cmd_merge(args: argparse.Namespace) -> int:
     
     trunk = _default_trunk_ref(root)
     trunk_ref = f"refs/heads/{trunk}"
-    trunk_worktree = _find_worktree_by_branch(root, trunk_ref)
+    existing_refs, worktrees = _git_state_snapshot(root, [trunk_ref, branch_ref])
+    trunk_worktree = _worktree_for_branch(worktrees, trunk_ref)
     
     # Handle --abort
     if args.abort:
         if trunk_worktree is None:
             raise HydraError(f"No trunk worktree found for {trunk}")
         _abort_merge(trunk_worktree)
-        print(f"Merge aborted in {trunk_worktree}")
+        print(f"Merge aborted in {trunk_worktree}", file=_stdout())
         return 0
     
-    if not _git_ref_exists(root, branch_ref):
+    if branch_ref not in existing_refs:
         # Check if this was a --no-worktree agent (no branch created)
         no_wt_marker = agents_dir / agent / task_id / ".no-worktree"
         if no_wt_marker.exists():
-            print(f"[hydra] Agent '{agent}' was opened with --no-worktree; no branch to merge (commits are already on trunk).")
+            print(f"[hydra] Agent '{agent}' was opened with --no-worktree; no branch to merge (commits are already on trunk).", file=_stdout())
             return 0
         raise HydraError(f"Agent branch not found: {branch_ref}")
 
-    trunk = _default_trunk_ref(root)
-    trunk_ref = f"refs/heads/{trunk}"
-
-    trunk_worktree = _find_worktree_by_branch(root, trunk_ref)
     created_trunk_worktree = False
     if trunk_worktree is None:
         wt = hydra_dir / "worktrees" / f"trunk-{trunk}-{_now_ts()}"
@@ -1703,7 +2343,7 @@ def cmd_merge(args: argparse.Namespace) -> int:
             raise HydraError(f"Trunk worktree {trunk_worktree} is on {head_branch!r}, expected {trunk!r}.")
         _ensure_worktree_clean(trunk_worktree, label=f"Trunk worktree ({trunk})", allow_untracked=True)
 
-        agent_worktree = _find_worktree_by_branch(root, branch_ref)
+        agent_worktree = _worktree_for_branch(worktrees, branch_ref)
         if agent_worktree is None:
             candidate = agents_dir / agent / task_id
             if candidate.exists():
@@ -1714,33 +2354,14 @@ def cmd_merge(args: argparse.Namespace) -> int:
         changed = _list_changed_files(root, base_ref=trunk, target_ref=branch)
         if changed:
             with _connect_db(hydra_dir) as conn:
-                _cleanup_dead_locks(conn)
-                conflicts: List[Tuple[str, str, str]] = []
-                for rel in changed:
-                    row = conn.execute("SELECT agent, task FROM locks WHERE file=?", (rel,)).fetchone()
-                    if row is None:
-                        continue
-                    locked_agent, locked_task = str(row[0]), str(row[1])
-                    if locked_agent != agent or locked_task != task_id:
-                        conflicts.append((rel, locked_agent, locked_task))
+                _cleanup_dead_locks(conn, force=True)
+                conflicts, total = _lock_conflicts(conn, changed, agent=agent, task=task_id, limit=50)
                 if conflicts:
-                    pretty = "\n".join([f"- {f} (held by {a}/{t})" for (f, a, t) in conflicts[:50]])
-                    more = "" if len(conflicts) <= 50 else f"\n... and {len(conflicts) - 50} more"
+                    pretty = "\n".join([f"- {f} (held by {a}/{t})" for (f, a, t) in conflicts])
+                    more = "" if total <= 50 else f"\n... and {total - 50} more"
                     raise HydraError(f"Merge blocked: target files are locked by other agents:\n{pretty}{more}")
 
-        env = os.environ.copy()
-        env.update(
-            {
-                "AGENT_ID": agent,
-                "TASK_ID": task_id,
-                "HYDRA_PROJECT_ROOT": str(root),
-                "HYDRA_TASK_FILE": str(_task_path(tasks_dir, task_id)),
-                "GIT_AUTHOR_NAME": f"{agent} Agent",
-                "GIT_AUTHOR_EMAIL": f"{agent}@agents.local",
-                "GIT_COMMITTER_NAME": f"{agent} Agent",
-                "GIT_COMMITTER_EMAIL": f"{agent}@agents.local",
-            }
-        )
+        env = _env_with(_agent_env(agent, task_id, root, tasks_dir))
 
         # Skip pre-commit hook during merge (we're merging agent work back to trunk)
         env["HYDRA_SKIP_HOOKS"] = "1"
@@ -1749,22 +2370,20 @@ def cmd_merge(args: argparse.Namespace) -> int:
             proc = _run(["git", "merge", "--squash", branch], cwd=trunk_worktree, capture=True, check=False, env=env)
             if proc.returncode != 0:
                 # Check if it's a conflict (not other errors)
-                status = _run(["git", "status", "--porcelain"], cwd=trunk_worktree, capture=True).stdout
-                has_conflicts = any(line.startswith("UU ") or line.startswith("AA ") or line.startswith("DD ") for line in status.splitlines())
-                
-                if has_conflicts:
+                conflict_files = _merge_conflict_files(trunk_worktree)
+
+                if conflict_files:
                     # Don't abort, let user resolve
-                    conflict_files = [line.split()[-1] for line in status.splitlines() if line.startswith(("UU ", "AA ", "DD "))]
-                    print(f"\n⚠️  Merge conflict while squash merging {branch!r} into {trunk!r}")
-                    print(f"\nConflict files:")
+                    print(f"\n⚠️  Merge conflict while squash merging {branch!r} into {trunk!r}", file=_stdout())
+                    print(f"\nConflict files:", file=_stdout())
                     for f in conflict_files:
-                        print(f"  - {f}")
-                    print(f"\nTo resolve:")
-                    print(f"  1. cd {trunk_worktree}")
-                    print(f"  2. Edit conflict files and resolve markers")
-                    print(f"  3. git add <resolved-files>")
-                    print(f"  4. git commit -m 'Merge {branch} into {trunk} (squash)'")
-                    print(f"  5. Or run: hydra merge {agent} --task {task_id} --abort  (to abort)")
+                        print(f"  - {f}", file=_stdout())
+                    print(f"\nTo resolve:", file=_stdout())
+                    print(f"  1. cd {trunk_worktree}", file=_stdout())
+                    print(f"  2. Edit conflict files and resolve markers", file=_stdout())
+                    print(f"  3. git add <resolved-files>", file=_stdout())
+                    print(f"  4. git commit -m 'Merge {branch} into {trunk} (squash)'", file=_stdout())
+                    print(f"  5. Or run: hydra merge {agent} --task {task_id} --abort  (to abort)", file=_stdout())
                     return 1  # Non-zero but don't abort
                 else:
                     # Other error, abort
@@ -1787,22 +2406,20 @@ def cmd_merge(args: argparse.Namespace) -> int:
             )
             if proc.returncode != 0:
                 # Check if it's a conflict (not other errors)
-                status = _run(["git", "status", "--porcelain"], cwd=trunk_worktree, capture=True).stdout
-                has_conflicts = any(line.startswith("UU ") or line.startswith("AA ") or line.startswith("DD ") for line in status.splitlines())
-                
-                if has_conflicts:
+                conflict_files = _merge_conflict_files(trunk_worktree)
+
+                if conflict_files:
                     # Don't abort, let user resolve
-                    conflict_files = [line.split()[-1] for line in status.splitlines() if line.startswith(("UU ", "AA ", "DD "))]
-                    print(f"\n⚠️  Merge conflict while merging {branch!r} into {trunk!r}")
-                    print(f"\nConflict files:")
+                    print(f"\n⚠️  Merge conflict while merging {branch!r} into {trunk!r}", file=_stdout())
+                    print(f"\nConflict files:", file=_stdout())
                     for f in conflict_files:
-                        print(f"  - {f}")
-                    print(f"\nTo resolve:")
-                    print(f"  1. cd {trunk_worktree}")
-                    print(f"  2. Edit conflict files and resolve markers")
-                    print(f"  3. git add <resolved-files>")
-                    print(f"  4. git commit --no-edit")
-                    print(f"  5. Or run: hydra merge {agent} --task {task_id} --abort  (to abort)")
+                        print(f"  - {f}", file=_stdout())
+                    print(f"\nTo resolve:", file=_stdout())
+                    print(f"  1. cd {trunk_worktree}", file=_stdout())
+                    print(f"  2. Edit conflict files and resolve markers", file=_stdout())
+                    print(f"  3. git add <resolved-files>", file=_stdout())
+                    print(f"  4. git commit --no-edit", file=_stdout())
+                    print(f"  5. Or run: hydra merge {agent} --task {task_id} --abort  (to abort)", file=_stdout())
                     return 1  # Non-zero but don't abort
                 else:
                     # Other error, abort
@@ -1819,36 +2436,37 @@ def cmd_merge(args: argparse.Namespace) -> int:
             _run(["git", "worktree", "remove", "--force", str(trunk_worktree)], cwd=root, capture=True, check=False)
 
     session = _tmux_session_name(agent, task_id)
-    if _tmux_session_exists(session):
-        _tmux(["kill-session", "-t", session], capture=True)
+    # kill-session is a no-op failure when the session is gone; no has-session probe.
+    try:
+        _tmux(["kill-session", "-t", session], capture=True, check=False)
+    except FileNotFoundError:
+        pass
 
     with _connect_db(hydra_dir) as conn:
         released = _release_locks(conn, agent=agent, task=task_id)
-    print(f"hydra: released {released} lock(s) for {agent}/{task_id}", file=sys.stderr)
+    print(f"hydra: released {released} lock(s) for {agent}/{task_id}", file=_stderr())
 
-    agent_worktree = _find_worktree_by_branch(root, branch_ref)
+    # Merging only touches the trunk worktree, so the snapshot still holds here.
+    agent_worktree = _worktree_for_branch(worktrees, branch_ref)
     if agent_worktree is None:
         candidate = agents_dir / agent / task_id
         if candidate.exists():
             agent_worktree = candidate
+    # Worktree removal and branch deletion are independent; run them in one shell.
+    cleanup: List[Tuple[List[str], str]] = []
     if agent_worktree is not None and agent_worktree.exists():
-        proc3 = _run(
-            ["git", "worktree", "remove", "--force", str(agent_worktree)],
-            cwd=root,
-            capture=True,
-            check=False,
+        cleanup.append(
+            (["git", "-C", str(root), "worktree", "remove", "--force", str(agent_worktree)], f"remove worktree {agent_worktree}")
         )
-        if proc3.returncode != 0:
-            msg = (proc3.stderr or proc3.stdout or "").strip()
-            print(f"hydra warning: failed to remove worktree {agent_worktree}: {msg}", file=sys.stderr)
-
-    if _git_ref_exists(root, branch_ref):
-        proc4 = _run(["git", "branch", "-D", branch], cwd=root, capture=True, check=False)
-        if proc4.returncode != 0:
-            msg = (proc4.stderr or proc4.stdout or "").strip()
-            print(f"hydra warning: failed to delete branch {branch!r}: {msg}", file=sys.stderr)
-
-    print(merged_sha)
+    if branch_ref in existing_refs:
+        cleanup.append((["git", "-C", str(root), "branch", "-D", branch], f"delete branch {branch!r}"))
+    if cleanup:
+        results = _run_sh_steps([argv for argv, _what in cleanup])
+        for (_argv, what), (rc, msg) in zip(cleanup, results):
+            if rc != 0:
+                print(f"hydra warning: failed to {what}: {msg}", file=_stderr())
+
+    print(merged_sha, file=_stdout())
     return 0
 
 
@@ -1862,17 +2480,19 @@ def cmd_rollback(args: argparse.Namespace) -> int:
     _load_task(tasks_dir, task_id)
     branch = f"agent/{agent}/{task_id}"
     branch_ref = f"refs/heads/{branch}"
-    if not _git_ref_exists(root, branch_ref):
-        raise HydraError(f"Agent branch not found: {branch_ref}")
-
     to_ref = _rewrite_headish_for_branch(args.to, branch=branch)
-    to_commit = _resolve_commit(root, to_ref)
-
-    proc = subprocess.run(  # nosec - CLI tool by design
-        ["git", "merge-base", "--is-ancestor", to_commit, branch],
-        cwd=str(root),
-    )
-    if proc.returncode != 0:
+    with _git_batcher(root) as resolve:
+        if resolve(branch_ref) is None:
+            raise HydraError(f"Agent branch not found: {branch_ref}")
+        to_commit = resolve(f"{to_ref}^{{commit}}")
+    if to_commit is None:
+        raise HydraError(f"Unable to resolve ref: {to_ref!r}")
+
+    # One rev-list answers both questions: left = commits only in to_commit (must be
+    # 0 for an ancestor), right = commits on the branch since to_commit.
+    counts = _run(["git", "rev-list", "--left-right", "--count", f"{to_commit}...{branch_ref}"], cwd=root).stdout.split()
+    behind, count = (int(counts[0]), int(counts[1])) if len(counts) == 2 else (1, 0)
+    if behind != 0:
         raise HydraError(f"--to {args.to!r} ({to_commit}) is not an ancestor of {branch!r}.")
 
     agent_worktree = _find_worktree_by_branch(root, branch_ref)
@@ -1890,10 +2510,8 @@ def cmd_rollback(args: argparse.Namespace) -> int:
 
     try:
         _ensure_worktree_clean(agent_worktree, label=f"Agent worktree ({agent}/{task_id})", allow_untracked=False)
-        count_out = _run(["git", "rev-list", "--count", f"{to_commit}..HEAD"], cwd=agent_worktree, capture=True).stdout
-        count = int((count_out or "0").strip() or "0")
         if count <= 0:
-            print("Nothing to rollback")
+            print("Nothing to rollback", file=_stdout())
             return 0
 
         proc2 = _run(["git", "revert", "--no-commit", f"{to_commit}..HEAD"], cwd=agent_worktree, capture=True, check=False)
@@ -1905,24 +2523,12 @@ def cmd_rollback(args: argparse.Namespace) -> int:
                 f"To resolve manually: git checkout {branch} && git revert --no-commit {to_commit}..HEAD\n{stderr}"
             )
 
-        env = os.environ.copy()
-        env.update(
-            {
-                "AGENT_ID": agent,
-                "TASK_ID": task_id,
-                "HYDRA_PROJECT_ROOT": str(root),
-                "HYDRA_TASK_FILE": str(_task_path(tasks_dir, task_id)),
-                "GIT_AUTHOR_NAME": f"{agent} Agent",
-                "GIT_AUTHOR_EMAIL": f"{agent}@agents.local",
-                "GIT_COMMITTER_NAME": f"{agent} Agent",
-                "GIT_COMMITTER_EMAIL": f"{agent}@agents.local",
-            }
-        )
+        env = _env_with(_agent_env(agent, task_id, root, tasks_dir))
 
         msg = f"Rollback {branch} to {args.to} ({to_commit[:12]})"
         _run(["git", "commit", "-m", msg], cwd=agent_worktree, capture=True, env=env)
         new_sha = _run(["git", "rev-parse", "HEAD"], cwd=agent_worktree, capture=True).stdout.strip()
-        print(new_sha)
+        print(new_sha, file=_stdout())
         return 0
     finally:
         if created_worktree and agent_worktree is not None:
@@ -1933,23 +2539,38 @@ def cmd_task_new(args: argparse.Namespace) -> int:
     root = _find_project_root()
     _hydra_dir, _agents_dir, tasks_dir = _ensure_dirs(root)
     task = _create_task(tasks_dir, title=args.title, allow=args.allow, explicit_id=args.id)
-    print(task.id)
+    print(task.id, file=_stdout())
     return 0
 
 
+def _read_task_head(path: str) -> Dict[str, object]:
+    """
+    Pull id/title/created out of a task file without a full parse when they sit in
+    its first block (the layout `_create_task` writes); otherwise parse it all.
+    """
+    with open(path, "rb") as f:
+        head = f.read(TASK_HEAD_BYTES)
+        fields = {key.decode(): _json_loads(value) for key, value in _RE_TASK_HEAD_FIELD.findall(head)}
+        if len(fields) == 3:
+            return fields
+        data = _json_loads(head + f.read())
+    return data if isinstance(data, dict) else {}
+
+
 def cmd_task_list(args: argparse.Namespace) -> int:
     root = _find_project_root()
     _hydra_dir, _agents_dir, tasks_dir = _ensure_dirs(root)
-    paths = sorted(tasks_dir.glob("t*.json"))
-    for p in paths:
+    with os.scandir(tasks_dir) as it:
+        names = sorted(e.name for e in it if e.name.startswith("t") and e.name.endswith(".json"))
+    for name in names:
         try:
-            data = json.loads(p.read_text(encoding="utf-8"))
-            tid = data.get("id", p.stem)
-            title = data.get("title", "")
-            created = data.get("created", 0)
-            print(f"{tid}\t{created}\t{title}")
+            fields = _read_task_head(os.path.join(tasks_dir, name))
+            tid = fields.get("id", name[: -len(".json")])
+            title = fields.get("title", "")
+            created = fields.get("created", 0)
+            print(f"{tid}\t{created}\t{title}", file=_stdout())
         except Exception:
-            print(p.name)
+            print(name, file=_stdout())
     return 0
 
 
@@ -1957,17 +2578,17 @@ def cmd_task_show(args: argparse.Namespace) -> int:
     root = _find_project_root()
     _hydra_dir, _agents_dir, tasks_dir = _ensure_dirs(root)
     task = _load_task(tasks_dir, args.task_id)
-    print(json.dumps(task.__dict__, indent=2, ensure_ascii=False))
+    print(json.dumps(task.__dict__, indent=2, ensure_ascii=False), file=_stdout())
     return 0
 
 
 def cmd_agent_open(args: argparse.Namespace) -> int:
     root = _find_project_root()
     hydra_dir, agents_dir, tasks_dir = _ensure_dirs(root)
-    config_path = _ensure_config(hydra_dir)
-    
+    _ensure_config(hydra_dir)
+
     # Load config to get tmux session name
-    config = json.loads(config_path.read_text(encoding="utf-8"))
+    config = _load_config(hydra_dir)
 
     agent = _sanitize_ref_component(args.name, label="agent name")
     task_id = _sanitize_task_id(args.task)
@@ -1984,18 +2605,25 @@ def cmd_agent_open(args: argparse.Namespace) -> int:
     project_session = config.get("tmux_session", "hydra")
     window_name = agent  # Use agent name as window name
 
-    files_to_lock = _expand_allow(root, task.allow)
+    # Expanding the allow globs walks the tree; only --lock needs the result.
+    files_to_lock = _expand_allow(root, task.allow) if args.lock else []
 
     if args.dry_run:
         if args.lock:
-            print("[dry-run] would lock", len(files_to_lock), "paths")
+            print("[dry-run] would lock", len(files_to_lock), "paths", file=_stdout())
         else:
-            print("[dry-run] no locking (optimistic concurrency)")
+            print("[dry-run] no locking (optimistic concurrency)", file=_stdout())
+
+    use_tmux = not args.no_tmux and _tmux_available()
 
-    # Only acquire locks if --lock is specified
+    # Only acquire locks if --lock is specified. One connection serves the whole
+    # command; the tmux session is recorded with the locks up front (the window is
+    # created in that session below), so success costs a single write transaction.
+    conn: Optional[sqlite3.Connection] = None
     if args.lock:
-        with _connect_db(hydra_dir) as conn:
-            _acquire_locks(conn, files=files_to_lock, agent=agent, task=task_id, tmux_session=None)
+        conn = _connect_db(hydra_dir)
+        lock_session = project_session if use_tmux and not no_worktree and not args.dry_run else None
+        _acquire_locks(conn, files=files_to_lock, agent=agent, task=task_id, tmux_session=lock_session)
 
     if no_worktree:
         # --no-worktree: skip auto-commit, worktree creation, and shared deps.
@@ -2005,20 +2633,21 @@ def cmd_agent_open(args: argparse.Namespace) -> int:
             marker.mkdir(parents=True, exist_ok=True)
             (marker / ".no-worktree").write_text("1", encoding="utf-8")
         else:
-            print(f"[dry-run] mkdir {marker} + write .no-worktree marker")
-        print(f"[hydra] --no-worktree: agent will work directly in {root}")
+            print(f"[dry-run] mkdir {marker} + write .no-worktree marker", file=_stdout())
+        print(f"[hydra] --no-worktree: agent will work directly in {root}", file=_stdout())
     else:
         # --- auto-commit unstaged/staged changes before worktree creation ---
         if not args.dry_run:
-            st = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, cwd=root)
+            st = _fast_run(["git", "status", "--porcelain"], cwd=root)
             if st.stdout.strip():
-                subprocess.run(["git", "add", "-A"], cwd=root, check=True)
-                subprocess.run(
+                _fast_run(["git", "add", "-A"], cwd=root, check=True, capture=False)
+                _fast_run(
                     ["git", "commit", "-m", f"auto: pre-worktree commit for {agent}"],
                     cwd=root,
                     check=True,
+                    capture=False,
                 )
-                print(f"[hydra] auto-committed unstaged changes before creating worktree")
+                print(f"[hydra] auto-committed unstaged changes before creating worktree", file=_stdout())
         # --- end auto-commit ---
 
     try:
@@ -2033,38 +2662,24 @@ def cmd_agent_open(args: argparse.Namespace) -> int:
             if not args.dry_run and hydra_source.exists() and not hydra_link.exists():
                 _relative_symlink(hydra_source, hydra_link, dry_run=False)
 
-        if not args.no_tmux and _tmux_available():
+        if use_tmux:
             shell = args.shell or os.environ.get("SHELL") or "/bin/bash"
-            env_vars = {
-                "AGENT_ID": agent,
-                "TASK_ID": task_id,
-                "HYDRA_PROJECT_ROOT": str(root),
-                "HYDRA_TASK_FILE": str(_task_path(tasks_dir, task_id)),
-                "GIT_AUTHOR_NAME": f"{agent} Agent",
-                "GIT_AUTHOR_EMAIL": f"{agent}@agents.local",
-                "GIT_COMMITTER_NAME": f"{agent} Agent",
-                "GIT_COMMITTER_EMAIL": f"{agent}@agents.local",
-            }
             _start_tmux_window(
                 project_session=project_session,
                 window_name=window_name,
                 worktree=worktree,
-                env_vars=env_vars,
+                env_vars=_agent_env(agent, task_id, root, tasks_dir),
                 shell=shell,
                 dry_run=args.dry_run,
             )
-            if not args.dry_run and args.lock:
-                with _connect_db(hydra_dir) as conn:
-                    _set_locks_tmux_session(conn, agent=agent, task=task_id, tmux_session=project_session)
-            print(f"tmux attach -t {project_session}")
+            print(f"tmux attach -t {project_session}", file=_stdout())
         else:
-            if not args.no_tmux and not _tmux_available():
-                print("hydra warning: tmux not found; created worktree without tmux session", file=sys.stderr)
-            print(worktree)
+            if not args.no_tmux:
+                print("hydra warning: tmux not found; created worktree without tmux session", file=_stderr())
+            print(worktree, file=_stdout())
     except Exception:
-        if args.lock:
-            with _connect_db(hydra_dir) as conn:
-                _release_locks(conn, agent=agent, task=task_id)
+        if conn is not None:
+            _release_locks(conn, agent=agent, task=task_id)
         raise
     return 0
 
@@ -2076,78 +2691,44 @@ def cmd_agent_close(args: argparse.Namespace) -> int:
     agent = _sanitize_ref_component(args.name, label="agent name")
     task_id = _sanitize_task_id(args.task)
 
+    kill_window: Optional[List[str]] = None
     # Close Zellij tab or tmux session
     if not args.keep_tmux:
         if _zellij_available():
             # Close Zellij tab
             try:
                 if args.dry_run:
-                    print(f"[dry-run] Close Zellij tab: {agent}")
+                    print(f"[dry-run] Close Zellij tab: {agent}", file=_stdout())
                 else:
-                    # Switch to the agent tab
-                    subprocess.run(
-                        ["zellij", "action", "go-to-tab-name", agent],
-                        check=False,
-                        capture_output=True,
-                        text=True
-                    )
-                    # Close the tab
-                    subprocess.run(
-                        ["zellij", "action", "close-tab"],
-                        check=True,
-                        capture_output=True,
-                        text=True
-                    )
-
-                    # Wait and switch back to main tab
-                    time.sleep(0.5)
-                    subprocess.run(
-                        ["zellij", "action", "go-to-tab-name", "main"],
-                        check=False,
-                        capture_output=True,
-                        text=True
-                    )
-                    print(f"Closed Zellij tab: {agent}")
+                    _zellij_in_tab(agent, [["close-tab"]])
+                    print(f"Closed Zellij tab: {agent}", file=_stdout())
             except subprocess.CalledProcessError as e:
-                print(f"Warning: Failed to close Zellij tab: {e.stderr}")
+                print(f"Warning: Failed to close Zellij tab: {e.stderr}", file=_stdout())
         elif _tmux_available():
             # Close tmux window
             # Get project session name from config
-            config_path = hydra_dir / CONFIG_NAME
-            session_name = root.name
-            if config_path.exists():
-                try:
-                    config = json.loads(config_path.read_text(encoding="utf-8"))
-                    session_name = config.get("tmux_session", root.name)
-                except Exception:
-                    pass
+            session_name = _cached_session_name(hydra_dir, root)
 
             window_target = f"{session_name}:{agent}"
             if args.dry_run:
-                print(f"[dry-run] tmux kill-window -t {window_target}")
+                print(f"[dry-run] tmux kill-window -t {window_target}", file=_stdout())
             else:
-                try:
-                    subprocess.run(
-                        ["tmux", "kill-window", "-t", window_target],
-                        check=True,
-                        capture_output=True,
-                        text=True
-                    )
-                    print(f"Closed tmux window: {agent}")
-                except subprocess.CalledProcessError as e:
-                    print(f"Warning: Failed to close tmux window: {e.stderr}")
+                # Deferred so it shares one shell with the worktree removal below.
+                kill_window = ["tmux", "kill-window", "-t", window_target]
 
     released = 0
     with _connect_db(hydra_dir) as conn:
         released = _release_locks(conn, agent=agent, task=task_id)
 
+    remove_worktree: Optional[List[str]] = None
+
     if args.remove_worktree:
         worktree = agents_dir / agent / task_id
         no_worktree = (worktree / ".no-worktree").exists()
         if no_worktree:
             # No real worktree to remove; just clean up the marker directory
             if args.dry_run:
-                print(f"[dry-run] rm -rf {worktree} (no-worktree marker only)")
+                print(f"[dry-run] rm -rf {worktree} (no-worktree marker only)", file=_stdout())
             else:
                 import shutil
                 shutil.rmtree(worktree, ignore_errors=True)
@@ -2155,15 +2736,29 @@ def cmd_agent_close(args: argparse.Namespace) -> int:
                 agent_dir = agents_dir / agent
                 if agent_dir.exists() and not any(agent_dir.iterdir()):
                     agent_dir.rmdir()
-                print(f"Cleaned up no-worktree marker for {agent}/{task_id}")
+                print(f"Cleaned up no-worktree marker for {agent}/{task_id}", file=_stdout())
         else:
             cmd = ["git", "worktree", "remove", "--force", str(worktree)]
             if args.dry_run:
-                print("[dry-run]", " ".join(cmd))
+                print("[dry-run]", " ".join(cmd), file=_stdout())
             else:
-                _run(cmd, cwd=root, capture=True)
+                remove_worktree = ["git", "-C", str(root), "worktree", "remove", "--force", str(worktree)]
+
+    steps = [step for step in (kill_window, remove_worktree) if step is not None]
+    if steps:
+        results = iter(_run_sh_steps(steps))
+        if kill_window is not None:
+            rc, msg = next(results)
+            if rc == 0:
+                print(f"Closed tmux window: {agent}", file=_stdout())
+            else:
+                print(f"Warning: Failed to close tmux window: {msg}", file=_stdout())
+        if remove_worktree is not None:
+            rc, msg = next(results)
+            if rc != 0:
+                raise HydraError(f"Command failed ({rc}): {' '.join(remove_worktree)}\n{msg}")
 
-    print(f"Released {released} locks for {agent}/{task_id}")
+    print(f"Released {released} locks for {agent}/{task_id}", file=_stdout())
     return 0
 
 
@@ -2186,14 +2781,7 @@ def cmd_agent_spawn(args: argparse.Namespace) -> int:
             raise HydraError(f"Worktree not found: {worktree}. Run 'agent open' first.")
 
     # Get project session name from config
-    config_path = hydra_dir / CONFIG_NAME
-    session_name = root.name  # Default
-    if config_path.exists():
-        try:
-            config = json.loads(config_path.read_text(encoding="utf-8"))
-            session_name = config.get("tmux_session", root.name)
-        except Exception:
-            pass
+    session_name = _cached_session_name(hydra_dir, root)
 
     # Determine agent type and command
     agent_type = args.type or "codex"
@@ -2207,20 +2795,16 @@ def cmd_agent_spawn(args: argparse.Namespace) -> int:
     # Send command to existing window
     window_target = f"{session_name}:{agent}"
     try:
-        if _tmux_available():
-            # Send the command to the window
-            subprocess.run(
-                ["tmux", "send-keys", "-t", window_target, cmd, "Enter"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            print(f"Created agent window '{agent}' in tmux session '{session_name}'")
-            print(f"Working directory: {worktree}")
-        else:
-            raise HydraError("tmux not found (required for `hydra agent spawn`).")
+        _fast_run(
+            ["tmux", "send-keys", "-t", window_target, cmd, "Enter"],
+            check=True
+        )
+    except FileNotFoundError:
+        raise HydraError("tmux not found (required for `hydra agent spawn`).")
     except subprocess.CalledProcessError as e:
         raise HydraError(f"Failed to spawn agent: {e.stderr}")
+    print(f"Created agent window '{agent}' in tmux session '{session_name}'", file=_stdout())
+    print(f"Working directory: {worktree}", file=_stdout())
 
     # Create agent guide file
     if agent_type == "codex":
@@ -2232,11 +2816,20 @@ def cmd_agent_spawn(args: argparse.Namespace) -> int:
 
     if not guide_file.exists():
         guide_file.write_text(template, encoding="utf-8")
-        print(f"Created {guide_file}")
+        print(f"Created {guide_file}", file=_stdout())
 
     return 0
 
 
+def _send_enter_delay() -> float:
+    # Pause before the submitting Enter in `agent send` (HYDRA_SEND_ENTER_DELAY
+    # seconds, default 1); TUIs like Codex can drop an Enter that arrives too early.
+    try:
+        return max(0.0, float(os.environ.get("HYDRA_SEND_ENTER_DELAY", "") or 1.0))
+    except ValueError:
+        return 1.0
+
+
 def cmd_agent_send(args: argparse.Namespace) -> int:
     """Send a message to an agent window."""
     root = _find_project_root()
@@ -2246,84 +2839,33 @@ def cmd_agent_send(args: argparse.Namespace) -> int:
     message = args.message
 
     # Get project session name from config
-    config_path = hydra_dir / CONFIG_NAME
-    session_name = root.name
-    if config_path.exists():
-        try:
-            config = json.loads(config_path.read_text(encoding="utf-8"))
-            session_name = config.get("tmux_session", root.name)
-        except Exception:
-            pass
+    session_name = _cached_session_name(hydra_dir, root)
 
     # Send message to agent window/tab
     window_target = f"{session_name}:{agent}"
     try:
         if _zellij_available():
-            # Use Zellij
-            # Switch to agent tab
-            subprocess.run(
-                ["zellij", "action", "go-to-tab-name", agent],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Send message
-            subprocess.run(
-                ["zellij", "action", "write-chars", message],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Send Enter key
-            subprocess.run(
-                ["zellij", "action", "write", "13"],  # CR
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            subprocess.run(
-                ["zellij", "action", "write", "10"],  # LF
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Wait 0.5 second before switching back
-            time.sleep(0.5)
-            # Switch back to main tab
-            subprocess.run(
-                ["zellij", "action", "go-to-tab-name", "main"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            print(f"Sent message to {agent}")
-        elif _tmux_available():
-            # Fallback to tmux
-            subprocess.run(
-                ["tmux", "send-keys", "-t", window_target, "-l", message],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Longer delay to ensure Codex is ready to receive Enter
-            time.sleep(1)
-            # Send Enter key twice (first one is newline in multi-line input, second one submits)
-            subprocess.run(
-                ["tmux", "send-keys", "-t", window_target, "Enter"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            time.sleep(1)
-            subprocess.run(
-                ["tmux", "send-keys", "-t", window_target, "Enter"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            print(f"Sent message to {agent}")
+            # Use Zellij: message, then CR and LF
+            _zellij_in_tab(agent, [["write-chars", message], ["write", "13"], ["write", "10"]])
+            print(f"Sent message to {agent}", file=_stdout())
         else:
-            raise HydraError("Neither zellij nor tmux found (required for `hydra agent send`).")
+            # Fallback to tmux: literal text and a first Enter (a newline in multi-line
+            # TUI inputs) in one client call, then the submitting Enter after a pause
+            # so the agent's input (e.g. Codex) is ready for it.
+            # tmux splits commands on an argument ending in ';' unless escaped as '\;'.
+            literal = message[:-1] + "\\;" if message.endswith(";") else message
+            _fast_run(
+                [
+                    "tmux", "send-keys", "-t", window_target, "-l", literal,
+                    ";", "send-keys", "-t", window_target, "Enter",
+                ],
+                check=True
+            )
+            time.sleep(_send_enter_delay())
+            _fast_run(["tmux", "send-keys", "-t", window_target, "Enter"], check=True)
+            print(f"Sent message to {agent}", file=_stdout())
+    except FileNotFoundError:
+        raise HydraError("Neither zellij nor tmux found (required for `hydra agent send`).")
     except subprocess.CalledProcessError as e:
         raise HydraError(f"Failed to send message: {e.stderr}")
 
@@ -2339,14 +2881,7 @@ def cmd_agent_read(args: argparse.Namespace) -> int:
     lines = args.lines or 50
 
     # Get project session name from config
-    config_path = hydra_dir / CONFIG_NAME
-    session_name = root.name
-    if config_path.exists():
-        try:
-            config = json.loads(config_path.read_text(encoding="utf-8"))
-            session_name = config.get("tmux_session", root.name)
-        except Exception:
-            pass
+    session_name = _cached_session_name(hydra_dir, root)
 
     # Capture pane output
     window_target = f"{session_name}:{agent}"
@@ -2354,51 +2889,34 @@ def cmd_agent_read(args: argparse.Namespace) -> int:
         if _zellij_available():
             # Use Zellij
             import tempfile
-            # Switch to agent tab
-            subprocess.run(
-                ["zellij", "action", "go-to-tab-name", agent],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Dump screen to temporary file
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as tmp:
+            # Dump screen to a temporary file (tmpfs when available: zellij has
+            # no stdout dump, so keep the round-trip off the disk)
+            shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt', dir=shm) as tmp:
                 tmp_path = tmp.name
-            subprocess.run(
-                ["zellij", "action", "dump-screen", tmp_path],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            # Read and print last N lines
-            with open(tmp_path, 'r') as f:
-                all_lines = f.readlines()
-                output_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-                print(''.join(output_lines), end='')
-            # Clean up temp file
-            Path(tmp_path).unlink()
-
-            # Wait 0.5 second before switching back
-            time.sleep(0.5)
-
-            # Switch back to main tab
-            subprocess.run(
-                ["zellij", "action", "go-to-tab-name", "main"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-        elif _tmux_available():
+            try:
+                try:
+                    _zellij_in_tab(agent, [["dump-screen", tmp_path]], return_to_main=False)
+                    # dump-screen is handled by the zellij server after the CLI returns,
+                    # so stay on the agent's tab until the file has been written.
+                    _wait_for_nonempty(tmp_path, timeout=0.5)
+                finally:
+                    _fast_run(["zellij", "action", "go-to-tab-name", "main"])
+                # Read and print last N lines
+                with open(tmp_path, 'r') as f:
+                    output_lines = f.read().splitlines(keepends=True)[-lines:]
+            finally:
+                os.unlink(tmp_path)
+            print(''.join(output_lines), end='', file=_stdout())
+        else:
             # Fallback to tmux
-            result = subprocess.run(
+            result = _fast_run(
                 ["tmux", "capture-pane", "-t", window_target, "-p", "-S", f"-{lines}"],
-                check=True,
-                capture_output=True,
-                text=True
+                check=True
             )
-            print(result.stdout)
-        else:
-            raise HydraError("Neither zellij nor tmux found (required for `hydra agent read`).")
+            print(result.stdout, file=_stdout())
+    except FileNotFoundError:
+        raise HydraError("Neither zellij nor tmux found (required for `hydra agent read`).")
     except subprocess.CalledProcessError as e:
         raise HydraError(f"Failed to read agent output: {e.stderr}")
 
@@ -2413,41 +2931,36 @@ def cmd_agent_notify(args: argparse.Namespace) -> int:
     message = args.message
 
     # Get project session name from config
-    config_path = hydra_dir / CONFIG_NAME
-    session_name = root.name
-    if config_path.exists():
-        try:
-            config = json.loads(config_path.read_text(encoding="utf-8"))
-            session_name = config.get("tmux_session", root.name)
-        except Exception:
-            pass
+    session_name = _cached_session_name(hydra_dir, root)
 
     # Send message to main window
     window_target = f"{session_name}:main"
+    literal = f"[Agent Notification] {message}"
+    if literal.endswith(";"):
+        literal = literal[:-1] + "\\;"
     try:
-        if not _tmux_available():
-            raise HydraError("tmux not found (required for `hydra agent notify`).")
-        # Send the message as text
-        subprocess.run(
-            ["tmux", "send-keys", "-t", window_target, "-l", f"[Agent Notification] {message}"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        # Send Enter key
-        subprocess.run(
-            ["tmux", "send-keys", "-t", window_target, "Enter"],
-            check=True,
-            capture_output=True,
-            text=True
+        # Send the message as text, then Enter, in one tmux client call
+        _fast_run(
+            [
+                "tmux", "send-keys", "-t", window_target, "-l", literal,
+                ";", "send-keys", "-t", window_target, "Enter",
+            ],
+            check=True
         )
-        print(f"Notification sent to main window")
+        print(f"Notification sent to main window", file=_stdout())
+    except FileNotFoundError:
+        raise HydraError("tmux not found (required for `hydra agent notify`).")
     except subprocess.CalledProcessError as e:
         raise HydraError(f"Failed to send notification: {e.stderr}")
 
     return 0
 
 
+def _scandir_dirs(path: "os.PathLike[str] | str") -> List[os.DirEntry]:
+    with os.scandir(path) as it:
+        return sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+
+
 def cmd_agent_list(args: argparse.Namespace) -> int:
     """List all agent worktrees."""
     root = _find_project_root()
@@ -2455,33 +2968,32 @@ def cmd_agent_list(args: argparse.Namespace) -> int:
 
     # Check if agents directory exists
     if not agents_dir.exists():
-        print("No agents found")
+        print("No agents found", file=_stdout())
         return 0
 
-    # Get all agent directories
-    agent_dirs = sorted([d for d in agents_dir.iterdir() if d.is_dir()])
+    # Get all agent directories (scandir: d_type comes with the listing, no stat per entry)
+    agent_dirs = _scandir_dirs(agents_dir)
 
     if not agent_dirs:
-        print("No agents found")
+        print("No agents found", file=_stdout())
         return 0
 
     # Display header
-    print(f"{'Agent':<20} {'Task ID':<15} {'Worktree Path'}")
-    print("-" * 80)
+    print(f"{'Agent':<20} {'Task ID':<15} {'Worktree Path'}", file=_stdout())
+    print("-" * 80, file=_stdout())
 
     # List each agent and its tasks
     for agent_dir in agent_dirs:
         agent_name = agent_dir.name
         # List all tasks for this agent
-        task_dirs = sorted([d for d in agent_dir.iterdir() if d.is_dir()])
+        task_dirs = _scandir_dirs(agent_dir.path)
 
         if not task_dirs:
-            print(f"{agent_name:<20} {'(no tasks)':<15}")
+            print(f"{agent_name:<20} {'(no tasks)':<15}", file=_stdout())
         else:
             for task_dir in task_dirs:
-                task_id = task_dir.name
-                worktree_path = task_dir.resolve()
-                print(f"{agent_name:<20} {task_id:<15} {worktree_path}")
+                # The project root is already resolved, so the joined path is canonical.
+                print(f"{agent_name:<20} {task_dir.name:<15} {task_dir.path}", file=_stdout())
 
     return 0
 
@@ -2493,7 +3005,7 @@ def cmd_locks_list(args: argparse.Namespace) -> int:
         _cleanup_dead_locks(conn)
         rows = _list_locks(conn)
     for f, a, t, ts, s in rows:
-        print(f"{f}\t{a}\t{t}\t{ts}\t{s}")
+        print(f"{f}\t{a}\t{t}\t{ts}\t{s}", file=_stdout())
     return 0
 
 
@@ -2503,23 +3015,22 @@ def cmd_locks_cleanup(args: argparse.Namespace) -> int:
     with _connect_db(hydra_dir) as conn:
         conn.execute("BEGIN IMMEDIATE;")
         try:
-            released = _cleanup_dead_locks(conn)
+            released = _cleanup_dead_locks(conn, force=True)
             conn.commit()
         except Exception:
             conn.rollback()
             raise
-    print(f"Released {released} dead locks")
+    print(f"Released {released} dead locks", file=_stdout())
     return 0
 
 
-def _build_parser() -> argparse.ArgumentParser:
-    p = argparse.ArgumentParser(prog="hydra", description="CodeHydra: Multi-agent git worktree manager (v0.1.0, Phase 5)")
-    sub = p.add_subparsers(dest="cmd", required=True)
-
+def _add_init_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("init", help="Initialize .hydra/, tasks/, and locks DB")
     sp.add_argument("--session", help="Explicit tmux session name (default: project directory name)")
     sp.set_defaults(func=cmd_init)
 
+
+def _add_snapshot_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("snapshot", help="Commit a debounced snapshot for an agent")
     sp.add_argument("agent", help="Agent name (e.g. codex-1)")
     sp.add_argument("--task", help="Task id (e.g. t1737123456). Required if agent has multiple tasks.")
@@ -2527,6 +3038,8 @@ def _build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--max-wait", type=float, default=60.0, help="Max seconds to wait for debounce (default: 60)")
     sp.set_defaults(func=cmd_snapshot)
 
+
+def _add_changes_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("changes", help="Show change history from .hydra/journal.jsonl")
     sp.add_argument(
         "--since",
@@ -2536,11 +3049,15 @@ def _build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--task", help="Filter by task id like t1737123456")
     sp.set_defaults(func=cmd_changes)
 
+
+def _add_diff_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("diff", help="Show git diff for an agent")
     sp.add_argument("agent", help="Agent name (e.g. codex-1)")
     sp.add_argument("--task", help="Task id (optional; shows all tasks when omitted)")
     sp.set_defaults(func=cmd_diff)
 
+
+def _add_merge_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("merge", help="Merge an agent branch into trunk (main/master)")
     sp.add_argument("agent", help="Agent name (e.g. codex-1)")
     sp.add_argument("--task", help="Task id (required if agent has multiple tasks)")
@@ -2548,109 +3065,261 @@ def _build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--abort", action="store_true", help="Abort an in-progress merge")
     sp.set_defaults(func=cmd_merge)
 
+
+def _add_rollback_parser(sub: "argparse._SubParsersAction") -> None:
     sp = sub.add_parser("rollback", help="Rollback an agent branch by reverting commits (history-preserving)")
     sp.add_argument("agent", help="Agent name (e.g. codex-1)")
     sp.add_argument("--task", help="Task id (required if agent has multiple tasks)")
     sp.add_argument("--to", required=True, help="Rollback target (e.g. HEAD~3, <sha>, or <branch>~N)")
     sp.set_defaults(func=cmd_rollback)
 
+
+def _add_task_parser(sub: "argparse._SubParsersAction", leaf: Optional[str] = None) -> None:
     task = sub.add_parser("task", help="Task management")
     task_sub = task.add_subparsers(dest="task_cmd", required=True)
 
-    sp = task_sub.add_parser("new", help="Create a new task")
-    sp.add_argument("title", help="Task title")
-    sp.add_argument("--allow", action="append", required=True, help="Allowed path glob (repeatable)")
-    sp.add_argument("--id", help="Explicit task id like t1737123456")
-    sp.set_defaults(func=cmd_task_new)
+    if leaf in (None, "new"):
+        sp = task_sub.add_parser("new", help="Create a new task")
+        sp.add_argument("title", help="Task title")
+        sp.add_argument("--allow", action="append", required=True, help="Allowed path glob (repeatable)")
+        sp.add_argument("--id", help="Explicit task id like t1737123456")
+        sp.set_defaults(func=cmd_task_new)
 
-    sp = task_sub.add_parser("list", help="List tasks")
-    sp.set_defaults(func=cmd_task_list)
+    if leaf in (None, "list"):
+        sp = task_sub.add_parser("list", help="List tasks")
+        sp.set_defaults(func=cmd_task_list)
 
-    sp = task_sub.add_parser("show", help="Show a task JSON")
-    sp.add_argument("task_id", help="Task id like t1737123456")
-    sp.set_defaults(func=cmd_task_show)
+    if leaf in (None, "show"):
+        sp = task_sub.add_parser("show", help="Show a task JSON")
+        sp.add_argument("task_id", help="Task id like t1737123456")
+        sp.set_defaults(func=cmd_task_show)
 
+
+def _add_agent_parser(sub: "argparse._SubParsersAction", leaf: Optional[str] = None) -> None:
     agent = sub.add_parser("agent", help="Agent management")
     agent_sub = agent.add_subparsers(dest="agent_cmd", required=True)
 
-    sp = agent_sub.add_parser("open", help="Create worktree and lock files for an agent")
-    sp.add_argument("name", help="Agent name (e.g. codex-1)")
-    sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
-    sp.add_argument("--base", help="Base ref for the agent branch (default: main/master/HEAD)")
-    sp.add_argument("--lock", action="store_true", help="Acquire file locks (default: no locking, resolve conflicts at merge)")
-    sp.add_argument("--no-tmux", action="store_true", help="Do not create a tmux session")
-    sp.add_argument("--shell", help="Shell to run inside tmux (default: $SHELL)")
-    sp.add_argument("--no-shared-deps", action="store_true", help="Do not symlink shared deps like node_modules")
-    sp.add_argument("--no-worktree", action="store_true", help="Skip worktree/branch creation; work directly in project root")
-    sp.add_argument("--dry-run", action="store_true", help="Print actions without changing anything")
-    sp.set_defaults(func=cmd_agent_open)
-
-    sp = agent_sub.add_parser("close", help="Release locks (and optionally close tmux/worktree)")
-    sp.add_argument("name", help="Agent name (e.g. codex-1)")
-    sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
-    sp.add_argument("--keep-tmux", action="store_true", help="Do not kill the tmux session")
-    sp.add_argument("--remove-worktree", action="store_true", help="git worktree remove --force")
-    sp.add_argument("--dry-run", action="store_true", help="Print actions without changing anything")
-    sp.set_defaults(func=cmd_agent_close)
-
-    sp = agent_sub.add_parser("spawn", help="Spawn agent in current session window")
-    sp.add_argument("name", help="Agent name (e.g. codex-1)")
-    sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
-    sp.add_argument("--type", choices=["codex", "gemini"], help="Agent type (default: codex)")
-    sp.set_defaults(func=cmd_agent_spawn)
-
-    sp = agent_sub.add_parser("send", help="Send message to agent")
-    sp.add_argument("name", help="Agent name (e.g. codex-1)")
-    sp.add_argument("message", help="Message to send")
-    sp.set_defaults(func=cmd_agent_send)
-
-    sp = agent_sub.add_parser("read", help="Read agent output")
-    sp.add_argument("name", help="Agent name (e.g. codex-1)")
-    sp.add_argument("--lines", type=int, help="Number of lines to read (default: 50)")
-    sp.set_defaults(func=cmd_agent_read)
-
-    sp = agent_sub.add_parser("notify", help="Send notification to main window (Claude Lead)")
-    sp.add_argument("message", help="Notification message")
-    sp.set_defaults(func=cmd_agent_notify)
-
-    sp = agent_sub.add_parser("list", help="List all agent worktrees")
-    sp.set_defaults(func=cmd_agent_list)
-
+    if leaf in (None, "open"):
+        sp = agent_sub.add_parser("open", help="Create worktree and lock files for an agent")
+        sp.add_argument("name", help="Agent name (e.g. codex-1)")
+        sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
+        sp.add_argument("--base", help="Base ref for the agent branch (default: main/master/HEAD)")
+        sp.add_argument("--lock", action="store_true", help="Acquire file locks (default: no locking, resolve conflicts at merge)")
+        sp.add_argument("--no-tmux", action="store_true", help="Do not create a tmux session")
+        sp.add_argument("--shell", help="Shell to run inside tmux (default: $SHELL)")
+        sp.add_argument("--no-shared-deps", action="store_true", help="Do not symlink shared deps like node_modules")
+        sp.add_argument("--no-worktree", action="store_true", help="Skip worktree/branch creation; work directly in project root")
+        sp.add_argument("--dry-run", action="store_true", help="Print actions without changing anything")
+        sp.set_defaults(func=cmd_agent_open)
+
+    if leaf in (None, "close"):
+        sp = agent_sub.add_parser("close", help="Release locks (and optionally close tmux/worktree)")
+        sp.add_argument("name", help="Agent name (e.g. codex-1)")
+        sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
+        sp.add_argument("--keep-tmux", action="store_true", help="Do not kill the tmux session")
+        sp.add_argument("--remove-worktree", action="store_true", help="git worktree remove --force")
+        sp.add_argument("--dry-run", action="store_true", help="Print actions without changing anything")
+        sp.set_defaults(func=cmd_agent_close)
+
+    if leaf in (None, "spawn"):
+        sp = agent_sub.add_parser("spawn", help="Spawn agent in current session window")
+        sp.add_argument("name", help="Agent name (e.g. codex-1)")
+        sp.add_argument("--task", required=True, help="Task id (e.g. t1737123456)")
+        sp.add_argument("--type", choices=["codex", "gemini"], help="Agent type (default: codex)")
+        sp.set_defaults(func=cmd_agent_spawn)
+
+    if leaf in (None, "send"):
+        sp = agent_sub.add_parser("send", help="Send message to agent")
+        sp.add_argument("name", help="Agent name (e.g. codex-1)")
+        sp.add_argument("message", help="Message to send")
+        sp.set_defaults(func=cmd_agent_send)
+
+    if leaf in (None, "read"):
+        sp = agent_sub.add_parser("read", help="Read agent output")
+        sp.add_argument("name", help="Agent name (e.g. codex-1)")
+        sp.add_argument("--lines", type=int, help="Number of lines to read (default: 50)")
+        sp.set_defaults(func=cmd_agent_read)
+
+    if leaf in (None, "notify"):
+        sp = agent_sub.add_parser("notify", help="Send notification to main window (Claude Lead)")
+        sp.add_argument("message", help="Notification message")
+        sp.set_defaults(func=cmd_agent_notify)
+
+    if leaf in (None, "list"):
+        sp = agent_sub.add_parser("list", help="List all agent worktrees")
+        sp.set_defaults(func=cmd_agent_list)
+
+
+def _add_locks_parser(sub: "argparse._SubParsersAction", leaf: Optional[str] = None) -> None:
     locks = sub.add_parser("locks", help="Inspect and cleanup file locks")
     locks_sub = locks.add_subparsers(dest="locks_cmd", required=True)
 
-    sp = locks_sub.add_parser("list", help="List current locks")
-    sp.set_defaults(func=cmd_locks_list)
+    if leaf in (None, "list"):
+        sp = locks_sub.add_parser("list", help="List current locks")
+        sp.set_defaults(func=cmd_locks_list)
 
-    sp = locks_sub.add_parser("cleanup", help="Release locks for missing tmux sessions")
-    sp.set_defaults(func=cmd_locks_cleanup)
+    if leaf in (None, "cleanup"):
+        sp = locks_sub.add_parser("cleanup", help="Release locks for missing tmux sessions")
+        sp.set_defaults(func=cmd_locks_cleanup)
 
+
+def _add_hook_parser(sub: "argparse._SubParsersAction", leaf: Optional[str] = None) -> None:
     hook = sub.add_parser("hook", help=argparse.SUPPRESS)
     hook_sub = hook.add_subparsers(dest="hook_cmd", required=True)
 
-    sp = hook_sub.add_parser("commit-msg", help=argparse.SUPPRESS)
-    sp.add_argument("msg_file", help=argparse.SUPPRESS)
-    sp.set_defaults(func=cmd_hook)
+    if leaf in (None, "commit-msg"):
+        sp = hook_sub.add_parser("commit-msg", help=argparse.SUPPRESS)
+        sp.add_argument("msg_file", help=argparse.SUPPRESS)
+        sp.set_defaults(func=cmd_hook)
+
+    if leaf in (None, "pre-commit"):
+        sp = hook_sub.add_parser("pre-commit", help=argparse.SUPPRESS)
+        sp.set_defaults(func=cmd_hook)
+
+    if leaf in (None, "post-commit"):
+        sp = hook_sub.add_parser("post-commit", help=argparse.SUPPRESS)
+        sp.set_defaults(func=cmd_hook)
+
+
+# Subcommand parsers in `hydra --help` order. main() builds only the one named on
+# the command line; help and unknown commands get the full tree.
+_SUBPARSER_BUILDERS: Dict[str, Callable[..., None]] = {
+    "init": _add_init_parser,
+    "snapshot": _add_snapshot_parser,
+    "changes": _add_changes_parser,
+    "diff": _add_diff_parser,
+    "merge": _add_merge_parser,
+    "rollback": _add_rollback_parser,
+    "task": _add_task_parser,
+    "agent": _add_agent_parser,
+    "locks": _add_locks_parser,
+    "hook": _add_hook_parser,
+}
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    # argparse writes usage/help/errors straight to sys.stdout/sys.stderr; route
+    # them through main()'s stream overrides like every other message.
+    def _print_message(self, message: str, file: Optional[TextIO] = None) -> None:
+        super()._print_message(message, _stdout() if file is sys.stdout else _stderr())
 
-    sp = hook_sub.add_parser("pre-commit", help=argparse.SUPPRESS)
-    sp.set_defaults(func=cmd_hook)
+    # Set on top-level parsers built for a single command, whose usage line would
+    # list only that command; their errors are reported by the full parser instead.
+    partial = False
 
-    sp = hook_sub.add_parser("post-commit", help=argparse.SUPPRESS)
-    sp.set_defaults(func=cmd_hook)
+    def error(self, message: str) -> NoReturn:
+        if self.partial:
+            _get_parser(()).error(message)
+        super().error(message)
 
+
+# Second-level commands of the grouped subcommands; their builders take a `leaf`
+# and then register only that one (e.g. `agent send` skips the other agent parsers).
+_NESTED_COMMANDS: Dict[str, Tuple[str, ...]] = {
+    "task": ("new", "list", "show"),
+    "agent": ("open", "close", "spawn", "send", "read", "notify", "list"),
+    "locks": ("list", "cleanup"),
+    "hook": ("commit-msg", "pre-commit", "post-commit"),
+}
+
+
+def _parser_key(arg_list: Sequence[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(command, leaf) to build for argv; None widens to the full level (help, typos)."""
+    cmd = arg_list[0] if arg_list and arg_list[0] in _SUBPARSER_BUILDERS else None
+    nested = _NESTED_COMMANDS.get(cmd or "", ())
+    leaf = arg_list[1] if len(arg_list) > 1 and arg_list[1] in nested else None
+    return cmd, leaf
+
+
+def _build_parser(only: Optional[str] = None, leaf: Optional[str] = None) -> argparse.ArgumentParser:
+    p = _ArgumentParser(prog="hydra", description="CodeHydra: Multi-agent git worktree manager (v0.1.0, Phase 5)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    if only in _SUBPARSER_BUILDERS:
+        p.partial = True
+        build = _SUBPARSER_BUILDERS[only]
+        if only in _NESTED_COMMANDS:
+            build(sub, leaf if leaf in _NESTED_COMMANDS[only] else None)
+        else:
+            build(sub)
+    else:
+        for build in _SUBPARSER_BUILDERS.values():
+            build(sub)
     return p
 
 
-def main(argv: Optional[Sequence[str]] = None) -> int:
-    parser = _build_parser()
-    args = parser.parse_args(list(argv) if argv is not None else None)
+# Parsers are stateless between parse_args() calls, so a long-lived host (the
+# MCP server) reuses one per (command, leaf) instead of rebuilding it every call.
+_PARSERS: Dict[Tuple[Optional[str], Optional[str]], argparse.ArgumentParser] = {}
+_PARSERS_LOCK = threading.Lock()
+
+
+def _get_parser(arg_list: Sequence[str]) -> argparse.ArgumentParser:
+    key = _parser_key(arg_list)
+    parser = _PARSERS.get(key)
+    if parser is None:
+        with _PARSERS_LOCK:
+            parser = _PARSERS.get(key)
+            if parser is None:
+                parser = _PARSERS[key] = _build_parser(*key)
+    return parser
+
+
+# Subcommands that take only positional arguments, dispatched by main() without
+# argparse when argv matches exactly (the MCP server's chatty `task list`-style calls).
+HANDLERS: Dict[Tuple[str, ...], Callable[[argparse.Namespace], int]] = {
+    ("task", "list"): cmd_task_list,
+    ("task", "show"): cmd_task_show,
+    ("agent", "list"): cmd_agent_list,
+    ("locks", "list"): cmd_locks_list,
+    ("locks", "cleanup"): cmd_locks_cleanup,
+}
+_HANDLER_POSITIONALS: Dict[Tuple[str, ...], Tuple[str, ...]] = {
+    ("task", "show"): ("task_id",),
+}
+
+
+def _fast_namespace(arg_list: Sequence[str]) -> Optional[argparse.Namespace]:
+    key = tuple(arg_list[:2])
+    func = HANDLERS.get(key)
+    if func is None:
+        return None
+    rest = arg_list[2:]
+    names = _HANDLER_POSITIONALS.get(key, ())
+    if len(rest) != len(names) or any(a.startswith("-") for a in rest):
+        return None  # options, help or a usage error: let argparse handle it
+    return argparse.Namespace(cmd=key[0], func=func, **{f"{key[0]}_cmd": key[1]}, **dict(zip(names, rest)))
+
+
+def main(
+    argv: Optional[Sequence[str]] = None,
+    *,
+    cwd: Optional[Path] = None,
+    stdout: Optional[TextIO] = None,
+    stderr: Optional[TextIO] = None,
+    git_backend: Optional[object] = None,
+) -> int:
+    tokens = [
+        (_CWD, _CWD.set(str(cwd) if cwd is not None else None)),
+        (_STDOUT, _STDOUT.set(stdout)),
+        (_STDERR, _STDERR.set(stderr)),
+        (_GIT_BACKEND, _GIT_BACKEND.set(git_backend)),
+    ]
     try:
-        return int(args.func(args))
-    except HydraError as e:
-        print(f"hydra error: {e}", file=sys.stderr)
-        return 2
-    except KeyboardInterrupt:
-        return 130
+        _reset_invocation_caches()
+        arg_list = list(argv) if argv is not None else sys.argv[1:]
+        args = _fast_namespace(arg_list)
+        if args is None:
+            args = _get_parser(arg_list).parse_args(arg_list)
+        try:
+            return int(args.func(args))
+        except HydraError as e:
+            print(f"hydra error: {e}", file=_stderr())
+            return 2
+        except KeyboardInterrupt:
+            return 130
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
 
 
 if __name__ == "__main__":
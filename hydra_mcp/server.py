@@ -4,15 +4,17 @@ import argparse
 
 from mcp.server.fastmcp import FastMCP
 
-from hydra_mcp.tools import register_tools
+from hydra_mcp.tools import register_tools, warm_import
 
 
-def build_server() -> FastMCP:
+def build_server(*, json_response: bool = False) -> FastMCP:
     mcp = FastMCP(
         name="Hydra",
         instructions="Hydra MCP server (stdio). Wraps hydra.py as Claude Code MCP tools.",
+        json_response=json_response,
     )
     register_tools(mcp)
+    warm_import()
     return mcp
 
 
@@ -24,9 +26,14 @@ def main(argv: list[str] | None = None) -> int:
         default="stdio",
         help="Transport to use (default: stdio).",
     )
+    parser.add_argument(
+        "--json-response",
+        action="store_true",
+        help="streamable-http: answer each request with one JSON body instead of an SSE stream.",
+    )
     args = parser.parse_args(argv)
 
-    mcp = build_server()
+    mcp = build_server(json_response=args.json_response)
     mcp.run(transport=args.transport)
     return 0
 
@@ -1,29 +1,41 @@
 from __future__ import annotations
 
-import contextlib
-import hashlib
-import importlib.util
 import io
 import json
 import os
-import subprocess
+import stat
 import sys
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 from types import ModuleType
-from typing import Any, Sequence
+from typing import TYPE_CHECKING, Any, Sequence
+
+if TYPE_CHECKING:
+    import subprocess
+
+# hashlib, importlib.util, shutil and subprocess are imported where they are
+# used: a stdio server is cold-started per session, so its startup path stays
+# small; hydra.py itself is imported by warm_import()'s background thread.
 
 from mcp.server.fastmcp import FastMCP
 from mcp.types import CallToolResult, TextContent
 
 
 def _iso_now() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    # Same shape as datetime.now(timezone.utc).isoformat(), without building datetime objects.
+    secs, ns = divmod(time.time_ns(), 1_000_000_000)
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(secs))}.{ns // 1000:06d}+00:00"
+
+
+# Compact JSON on the wire; set HYDRA_MCP_PRETTY=1 for indented payloads when debugging.
+_JSON_INDENT: int | None = 2 if os.environ.get("HYDRA_MCP_PRETTY") else None
+_JSON_SEPARATORS = (",", ": ") if _JSON_INDENT else (",", ":")
 
 
 def _json_text(obj: Any) -> str:
-    return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, indent=_JSON_INDENT, separators=_JSON_SEPARATORS)
 
 
 def _tool_ok(result: Any) -> dict[str, Any]:
@@ -43,24 +55,26 @@ class MCPError(Exception):
         return out
 
 
+def _text_content(payload: dict[str, Any]) -> list[TextContent]:
+    # The JSON text mirror is for clients that ignore structuredContent; skip the
+    # second encode when the operator knows every client reads the structured form.
+    if _STATE.structured_only:
+        return []
+    return [TextContent(type="text", text=_json_text(payload))]
+
+
 def _tool_error(err: MCPError) -> CallToolResult:
     payload = err.to_dict()
-    return CallToolResult(
-        isError=True,
-        structuredContent=payload,
-        content=[TextContent(type="text", text=_json_text(payload))],
-    )
+    return CallToolResult(isError=True, structuredContent=payload, content=_text_content(payload))
 
 
 def _tool_success(payload: dict[str, Any]) -> CallToolResult:
-    return CallToolResult(
-        isError=False,
-        structuredContent=payload,
-        content=[TextContent(type="text", text=_json_text(payload))],
-    )
+    return CallToolResult(isError=False, structuredContent=payload, content=_text_content(payload))
 
 
 def _run_git(path: Path, args: Sequence[str]) -> subprocess.CompletedProcess[str]:
+    import subprocess
+
     return subprocess.run(
         ["git", *args],
         cwd=str(path),
@@ -70,38 +84,163 @@ def _run_git(path: Path, args: Sequence[str]) -> subprocess.CompletedProcess[str
     )
 
 
+_PYGIT2: ModuleType | None | bool = False  # False: not tried yet; None: not installed
+
+
+def _discover_toplevel(path: Path) -> Path | None:
+    """Work tree root via pygit2 when it is installed (no git fork); None means ask git."""
+    global _PYGIT2
+    if _PYGIT2 is False:
+        try:
+            import pygit2
+        except ImportError:
+            pygit2 = None
+        _PYGIT2 = pygit2
+    if _PYGIT2 is None:
+        return None
+    try:
+        git_dir = _PYGIT2.discover_repository(str(path))
+        workdir = _PYGIT2.Repository(git_dir).workdir if git_dir else None
+    except Exception:
+        return None
+    return Path(workdir).resolve() if workdir else None
+
+
+# input path -> (mtime_ns of <toplevel>/.git, toplevel); revalidated with one stat.
+_TOPLEVEL_CACHE: dict[Path, tuple[int, Path]] = {}
+# input path -> monotonic deadline; non-repos are remembered only briefly.
+_NOT_A_REPO_CACHE: dict[Path, float] = {}
+_NOT_A_REPO_TTL = 2.0
+
+
 def _git_toplevel(path: Path) -> Path:
-    proc = _run_git(path, ["rev-parse", "--show-toplevel"])
-    if proc.returncode != 0 or not (proc.stdout or "").strip():
+    cached = _TOPLEVEL_CACHE.get(path)
+    if cached is not None:
+        mtime_ns, top = cached
+        try:
+            if (top / ".git").stat().st_mtime_ns == mtime_ns:
+                return top
+        except OSError:
+            pass
+        _TOPLEVEL_CACHE.pop(path, None)
+    if _NOT_A_REPO_CACHE.get(path, 0.0) > time.monotonic():
         raise MCPError("INVALID_ARG", f"Not a git repository: {path}")
-    return Path(proc.stdout.strip()).expanduser().resolve()
-
 
-@contextlib.contextmanager
-def _pushd(path: Path):
-    prev = Path.cwd()
-    os.chdir(str(path))
+    top = _discover_toplevel(path)
+    if top is None:
+        proc = _run_git(path, ["rev-parse", "--show-toplevel"])
+        if proc.returncode != 0 or not (proc.stdout or "").strip():
+            _NOT_A_REPO_CACHE[path] = time.monotonic() + _NOT_A_REPO_TTL
+            raise MCPError("INVALID_ARG", f"Not a git repository: {path}")
+        top = Path(proc.stdout.strip()).expanduser().resolve()
+    _NOT_A_REPO_CACHE.pop(path, None)
     try:
-        yield
-    finally:
-        os.chdir(str(prev))
+        _TOPLEVEL_CACHE[path] = ((top / ".git").stat().st_mtime_ns, top)
+    except OSError:
+        pass
+    return top
+
+
+class _GitBatch:
+    """One long-lived `git cat-file --batch` process per project, shared by tool calls."""
+
+    _KINDS = frozenset({b"blob", b"tree", b"commit", b"tag"})
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._proc: subprocess.Popen[bytes] | None = None
+        self._lock = threading.Lock()
+
+    def _process(self) -> subprocess.Popen[bytes]:
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            import subprocess
+
+            # Started on first use: most tool calls never read objects.
+            proc = self._proc = subprocess.Popen(
+                ["git", "-C", str(self.root), "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return proc
+
+    def read_object(self, spec: str) -> tuple[str, str, bytes] | None:
+        """Return (object id, type, content) for `spec`, or None if it does not resolve."""
+        if not spec or "\n" in spec:
+            return None
+        with self._lock:
+            proc = self._process()
+            assert proc.stdin is not None and proc.stdout is not None
+            proc.stdin.write(spec.encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            # "<oid> <type> <size>\n<content>\n", or "<spec> missing|ambiguous\n".
+            parts = proc.stdout.readline().split()
+            if len(parts) != 3 or parts[1] not in self._KINDS or not parts[2].isdigit():
+                return None
+            content = proc.stdout.read(int(parts[2]) + 1)[:-1]
+        return parts[0].decode("ascii"), parts[1].decode("ascii"), content
+
+    def resolve(self, spec: str) -> str | None:
+        obj = self.read_object(spec)
+        return obj[0] if obj is not None else None
 
 
 @dataclass
 class _State:
     project_root: Path | None = None
+    git_batches: dict[Path, _GitBatch] = field(default_factory=dict)
+    structured_only: bool = field(default_factory=lambda: bool(os.environ.get("HYDRA_MCP_STRUCTURED_ONLY")))
 
 
 _STATE = _State()
 _HYDRA_CACHE: ModuleType | None = None
+_HYDRA_SHA_CACHE: tuple[tuple[int, int, int], str] | None = None
+
+
+# Repo root is one level above this package directory; resolved once at import.
+_HYDRA_PY_PATH = (Path(__file__).resolve().parents[1] / "hydra.py").resolve()
 
 
 def _hydra_py_path() -> Path:
-    # Repo root is one level above this package directory.
-    return (Path(__file__).resolve().parents[1] / "hydra.py").resolve()
+    return _HYDRA_PY_PATH
+
+
+def _hydra_sha1(hydra_path: Path) -> str | None:
+    # Re-hash only when the file changes; polling clients otherwise pay a full
+    # read + SHA-1 of hydra.py per hydraInfo call.
+    global _HYDRA_SHA_CACHE
+    try:
+        st = hydra_path.stat()
+    except FileNotFoundError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _HYDRA_SHA_CACHE
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    import hashlib
+
+    with open(hydra_path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+: hashes in C, no whole-file bytes copy
+            sha1 = hashlib.file_digest(f, "sha1").hexdigest()
+        else:
+            sha1 = hashlib.sha1(f.read()).hexdigest()
+    _HYDRA_SHA_CACHE = (key, sha1)
+    return sha1
+
+
+_HYDRA_LOCK = threading.Lock()
 
 
 def _load_hydra() -> ModuleType:
+    if _HYDRA_CACHE is not None:
+        return _HYDRA_CACHE
+    # The warm-up thread and a first tool call may race here; only one executes hydra.py.
+    with _HYDRA_LOCK:
+        return _load_hydra_locked()
+
+
+def _load_hydra_locked() -> ModuleType:
     global _HYDRA_CACHE
     if _HYDRA_CACHE is not None:
         return _HYDRA_CACHE
@@ -110,18 +249,50 @@ def _load_hydra() -> ModuleType:
     if not hydra_path.is_file():
         raise MCPError("NOT_FOUND", "hydra.py not found next to hydra_mcp package", {"hydraPath": str(hydra_path)})
 
-    mod_name = f"hydra_mcp_hydra_{hashlib.sha1(str(hydra_path).encode('utf-8')).hexdigest()[:12]}"
+    # A fixed name: bytecode caching is keyed on the source path anyway, and a
+    # module already loaded under it (e.g. by a re-imported tools module) is reused.
+    mod_name = "_hydra_embedded"
+    mod = sys.modules.get(mod_name)
+    if mod is not None and getattr(mod, "__file__", None) == str(hydra_path):
+        _HYDRA_CACHE = mod
+        return mod
+    import importlib.util
+
     spec = importlib.util.spec_from_file_location(mod_name, str(hydra_path))
     if spec is None or spec.loader is None:
         raise MCPError("INTERNAL", f"Failed to import hydra.py from {hydra_path}")
     mod = importlib.util.module_from_spec(spec)
     sys.modules[mod_name] = mod
-    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    try:
+        spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    except BaseException:
+        # Don't leave a half-initialized module for the guard above to reuse.
+        sys.modules.pop(mod_name, None)
+        raise
     _HYDRA_CACHE = mod
     return mod
 
 
-def _require_project_root(project_root: str | None = None) -> Path:
+def warm_import() -> threading.Thread:
+    """Compile and import hydra.py in a background thread, off the server's startup path."""
+    thread = threading.Thread(target=_warm_import, name="hydra-warm-import", daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_import() -> None:
+    import py_compile
+
+    # Failures are left for the first tool call to report.
+    try:
+        if py_compile.compile(str(_hydra_py_path()), doraise=False) is not None:
+            _load_hydra()
+    except Exception:
+        pass
+
+
+def _require_project_root(project_root: str | None = None, *, remember: bool = True) -> Path:
+    """Project for a tool call; an explicit root becomes the session default only if `remember`."""
     if project_root is not None:
         root_in = Path(project_root).expanduser()
         if not root_in.is_absolute():
@@ -129,7 +300,8 @@ def _require_project_root(project_root: str | None = None) -> Path:
         if not root_in.exists() or not root_in.is_dir():
             raise MCPError("INVALID_ARG", "projectRoot must be an existing directory", {"projectRoot": project_root})
         root = _git_toplevel(root_in)
-        _STATE.project_root = root
+        if remember:
+            _STATE.project_root = root
         return root
 
     if _STATE.project_root is not None:
@@ -141,50 +313,75 @@ def _require_project_root(project_root: str | None = None) -> Path:
     return root
 
 
+_BUFS = threading.local()
+
+
+def _capture_buffers() -> tuple[io.StringIO, io.StringIO]:
+    # One reusable pair per worker thread; a call never re-enters itself on a thread.
+    bufs = getattr(_BUFS, "pair", None)
+    if bufs is None:
+        bufs = _BUFS.pair = (io.StringIO(), io.StringIO())
+    for buf in bufs:
+        buf.seek(0)
+        buf.truncate(0)
+    return bufs
+
+
 def _capture_hydra_main(hydra: ModuleType, argv: Sequence[str], *, cwd: Path) -> tuple[int, str, str]:
-    stdout_buf = io.StringIO()
-    stderr_buf = io.StringIO()
-    with _pushd(cwd), contextlib.redirect_stdout(stdout_buf), contextlib.redirect_stderr(stderr_buf):
-        code = int(hydra.main(list(argv)))  # type: ignore[attr-defined]
-    return code, stdout_buf.getvalue(), stderr_buf.getvalue()
+    """Run `hydra.main(argv)` in `cwd`; returns (exit code, stripped stdout, stripped stderr)."""
+    # hydra.main takes the working directory and output streams per call, so
+    # concurrent tool calls neither chdir the server nor swap sys.stdout/stderr.
+    stdout_buf, stderr_buf = _capture_buffers()
+    git_batch = _STATE.git_batches.setdefault(cwd, _GitBatch(cwd))
+    code = int(
+        hydra.main(list(argv), cwd=cwd, stdout=stdout_buf, stderr=stderr_buf, git_backend=git_batch)  # type: ignore[attr-defined]
+    )
+    return code, stdout_buf.getvalue().strip(), stderr_buf.getvalue().strip()
 
 
 def _maybe_install_hydra_py(project_root: Path, *, force: bool = False) -> dict[str, Any]:
     src = _hydra_py_path()
-    dst = (project_root / "hydra.py").resolve()
-    if dst.exists() and not force:
-        return {"installed": False, "reason": "already-exists", "path": str(dst)}
-    if dst.exists() and dst.is_dir():
-        raise MCPError("CONFLICT", "Project hydra.py path is a directory", {"path": str(dst)})
+    dst = os.path.join(project_root, "hydra.py")
+    try:
+        st = os.lstat(dst)
+    except FileNotFoundError:
+        st = None
+    if st is not None:
+        if stat.S_ISDIR(st.st_mode):
+            raise MCPError("CONFLICT", "Project hydra.py path is a directory", {"path": dst})
+        if not force:
+            return {"installed": False, "reason": "already-exists", "path": dst}
 
     # Prefer a relative symlink for portability.
     try:
-        if dst.exists():
-            dst.unlink()
-        rel = os.path.relpath(str(src), start=str(project_root))
-        dst.symlink_to(rel)
-        return {"installed": True, "mode": "symlink", "path": str(dst), "target": rel}
+        if st is not None:
+            os.unlink(dst)
+        rel = os.path.relpath(src, project_root)
+        os.symlink(rel, dst)
+        return {"installed": True, "mode": "symlink", "path": dst, "target": rel}
     except OSError:
         # Fallback: copy the file.
         try:
-            dst.write_text(src.read_text(encoding="utf-8"), encoding="utf-8")
-            return {"installed": True, "mode": "copy", "path": str(dst), "target": str(src)}
+            import shutil
+
+            shutil.copyfile(src, dst)
+            return {"installed": True, "mode": "copy", "path": dst, "target": str(src)}
         except Exception as e:
             raise MCPError("INTERNAL", f"Failed to install hydra.py: {e}") from None
 
 
 def register_tools(server: FastMCP) -> None:
-    server.add_tool(hydraInfo, name="hydraInfo", structured_output=False)
-    server.add_tool(hydraSetProject, name="hydraSetProject", structured_output=False)
-    server.add_tool(hydraInit, name="hydraInit", structured_output=False)
-    server.add_tool(hydraRun, name="hydraRun", structured_output=False)
+    server.add_tool(hydraInfo, name="hydraInfo", structured_output=True)
+    server.add_tool(hydraSetProject, name="hydraSetProject", structured_output=True)
+    server.add_tool(hydraInit, name="hydraInit", structured_output=True)
+    server.add_tool(hydraRun, name="hydraRun", structured_output=True)
 
 
 def hydraInfo() -> CallToolResult:
     """Return information about the Hydra implementation used by this MCP server."""
     try:
         hydra_path = _hydra_py_path()
-        sha1 = hashlib.sha1(hydra_path.read_bytes()).hexdigest() if hydra_path.exists() else None
+        sha1 = _hydra_sha1(hydra_path)
         payload = _tool_ok({"hydraPath": str(hydra_path), "sha1": sha1})
         return _tool_success(payload)
     except MCPError as e:
@@ -230,8 +427,8 @@ def hydraInit(projectRoot: str, session: str | None = None, installHydraPy: bool
             {
                 "projectRoot": str(root),
                 "exitCode": code,
-                "stdout": out.strip(),
-                "stderr": err.strip(),
+                "stdout": out,
+                "stderr": err,
                 "installedHydraPy": install_result,
             }
         )
@@ -249,19 +446,17 @@ def hydraRun(args: list[str], projectRoot: str | None = None) -> CallToolResult:
     Example:
       args=["task","list"]
     """
+    # `args: list[str]` is validated by FastMCP's generated pydantic model before this runs.
     try:
-        if not isinstance(args, list) or not all(isinstance(x, str) for x in args):
-            raise MCPError("INVALID_ARG", "args must be a list of strings", {"args": args})
-
-        root = _require_project_root(projectRoot)
+        root = _require_project_root(projectRoot, remember=False)
         hydra = _load_hydra()
         code, out, err = _capture_hydra_main(hydra, args, cwd=root)
         payload = _tool_ok(
             {
                 "projectRoot": str(root),
                 "exitCode": code,
-                "stdout": out.strip(),
-                "stderr": err.strip(),
+                "stdout": out,
+                "stderr": err,
             }
         )
         return _tool_success(payload)
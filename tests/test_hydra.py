@@ -0,0 +1,211 @@
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import hydra  # noqa: E402
+
+
+def _glob_lock_set(root: Path, patterns):
+    """The lock set `_expand_allow` used to compute with one glob.glob per pattern."""
+    locked = set()
+    for pattern in patterns:
+        for match in glob.glob(str(root / pattern), recursive=True):
+            resolved = Path(match).resolve()
+            if resolved.is_file():
+                try:
+                    locked.add(resolved.relative_to(root).as_posix())
+                except ValueError:
+                    pass
+    return sorted(locked)
+
+
+class ExpandAllowTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name).resolve()
+        for rel in ("a.py", "src/b.py", "src/sub/c.py", "src/.hidden.py", "target/t.py", "venv/v.py", "src/notes.txt"):
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x\n")
+
+    def test_matches_glob_lock_set(self):
+        for patterns in (["**/*.py"], ["src/*.py"], ["*.py"], ["src/**"], ["target/*", "venv/**/*.py"], ["src/[!n]*"]):
+            with self.subTest(patterns=patterns):
+                self.assertEqual(hydra._expand_allow(self.root, patterns), _glob_lock_set(self.root, patterns))
+
+    def test_segment_aware(self):
+        self.assertEqual(hydra._expand_allow(self.root, ["*.py"]), ["a.py"])
+        self.assertEqual(hydra._expand_allow(self.root, ["src/*.py"]), ["src/b.py"])
+        self.assertIn("a.py", hydra._expand_allow(self.root, ["**/*.py"]))
+
+    def test_symlinked_directory_locks_resolved_paths(self):
+        (self.root / "lib").symlink_to("src")
+        self.assertEqual(hydra._expand_allow(self.root, ["lib/*.py"]), ["src/b.py"])
+        self.assertEqual(hydra._expand_allow(self.root, ["lib/**/*.py"]), _glob_lock_set(self.root, ["lib/**/*.py"]))
+
+    def test_walk_starts_at_literal_prefix(self):
+        scanned = []
+        real_scandir = os.scandir
+
+        def scandir(path):
+            scanned.append(Path(path).relative_to(self.root).as_posix())
+            return real_scandir(path)
+
+        with mock.patch.object(hydra.os, "scandir", scandir):
+            hydra._expand_allow(self.root, ["src/*.py"])
+        self.assertEqual(scanned, ["src"])
+
+    def test_explicit_paths_locked_even_if_missing(self):
+        self.assertEqual(hydra._expand_allow(self.root, ["src/new.py"]), ["src/new.py"])
+
+
+class FastDispatchTest(unittest.TestCase):
+    def test_task_show_takes_fast_path(self):
+        args = hydra._fast_namespace(["task", "show", "t001"])
+        self.assertIsNotNone(args)
+        self.assertIs(args.func, hydra.cmd_task_show)
+        self.assertEqual(args.task_id, "t001")
+
+    def test_wrong_arity_falls_back_to_argparse(self):
+        for argv in (["task", "show"], ["task", "show", "a", "b"], ["task", "show", *"abcdefg"]):
+            with self.subTest(argv=argv):
+                self.assertIsNone(hydra._fast_namespace(argv))
+                err = io.StringIO()
+                with self.assertRaises(SystemExit) as cm:
+                    hydra.main(argv, stdout=io.StringIO(), stderr=err)
+                self.assertEqual(cm.exception.code, 2)
+                self.assertIn("error:", err.getvalue())
+
+    def test_top_level_errors_show_full_usage(self):
+        err = io.StringIO()
+        with self.assertRaises(SystemExit):
+            hydra.main(["task", "show", "a", "b"], stdout=io.StringIO(), stderr=err)
+        self.assertIn("snapshot", err.getvalue())
+        self.assertIn("unrecognized arguments: b", err.getvalue())
+
+
+class TaskHeadTest(unittest.TestCase):
+    def test_number_cut_at_head_boundary_is_not_trusted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "t1.json"
+            # Slide `created` across the TASK_HEAD_BYTES boundary one byte at a time.
+            for pad in range(40):
+                allow = ["src/" + "x" * (hydra.TASK_HEAD_BYTES - 120) + "y" * pad]
+                task = {"id": "t1", "title": "T", "allow": allow, "created": 1737123456}
+                path.write_text(json.dumps(task, indent=2) + "\n")
+                with self.subTest(pad=pad):
+                    self.assertEqual(hydra._read_task_head(str(path))["created"], 1737123456)
+
+
+class ConcurrentMainTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name).resolve()
+        subprocess.run(["git", "init", "-q", str(self.root)], check=True)
+        self.assertEqual(self._main(["init", "--session", "hydra-test"])[0], 0)
+
+    def _main(self, argv):
+        out, err = io.StringIO(), io.StringIO()
+        code = hydra.main(argv, cwd=self.root, stdout=out, stderr=err)
+        return code, out.getvalue(), err.getvalue()
+
+    def test_lock_transactions_in_parallel_threads(self):
+        def worker(_):
+            return [self._main(["locks", "cleanup"]) for _ in range(25)] + [self._main(["locks", "list"])]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = [r for batch in pool.map(worker, range(4)) for r in batch]
+        for code, _out, err in results:
+            self.assertEqual((code, err), (0, ""))
+
+
+class TrunkCandidatesTest(unittest.TestCase):
+    def test_branch_below_main_is_not_trunk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            git = ["git", "-C", str(root), "-c", "user.name=t", "-c", "user.email=t@t"]
+            subprocess.run(["git", "init", "-q", "-b", "dev", str(root)], check=True)
+            subprocess.run([*git, "commit", "-q", "--allow-empty", "-m", "init"], check=True)
+            subprocess.run([*git, "branch", "main/foo"], check=True)
+            self.assertEqual(hydra._trunk_candidates(root), [])
+            subprocess.run([*git, "branch", "master"], check=True)
+            self.assertEqual(hydra._trunk_candidates(root), ["master"])
+
+
+class JournalIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "journal.jsonl"
+
+    def _append(self, ts, sha):
+        hydra._append_journal_jsonl(self.path, {"ts": ts, "sha": sha, "agent": "a", "task": "t1", "files": ""})
+
+    def _since(self, ts):
+        entries, _invalid = hydra._read_journal_entries_since(self.path, ts)
+        return [e.sha for e in entries if e.ts >= ts]
+
+    def test_clock_stepping_back_keeps_later_entries(self):
+        for i in range(3):
+            self._append(1_700_000_000 + i, f"s{i}")
+        for i in range(20):
+            self._append(1_600_000_000 + i, f"rewound{i}")
+        self.assertEqual(self._since(1_700_000_000), ["s0", "s1", "s2"])
+        self.assertEqual(self._since(1_600_000_015), ["s0", "s1", "s2"] + [f"rewound{i}" for i in range(15, 20)])
+
+    def test_journal_rewritten_in_place_is_not_read_through_old_index(self):
+        for i in range(20):
+            self._append(1_700_000_000 + i, f"old{i}" + "x" * 200)
+        # Truncate and rewrite through the same inode with shorter lines.
+        lines = [json.dumps({"ts": 1_700_000_000 + i, "sha": f"new{i}"}) + "\n" for i in range(200)]
+        with self.path.open("r+") as f:
+            f.truncate(0)
+            f.write("".join(lines))
+        self.assertEqual(self._since(1_700_000_010), [f"new{i}" for i in range(10, 200)])
+
+class EnvTest(unittest.TestCase):
+    def test_child_env_sees_later_environ_changes(self):
+        with mock.patch.dict(os.environ, {"HYDRA_TEST_LATE_VAR": "1"}):
+            env = hydra._env_with({"AGENT_ID": "a1"})
+        self.assertEqual((env["HYDRA_TEST_LATE_VAR"], env["AGENT_ID"]), ("1", "a1"))
+
+
+class RollbackTest(unittest.TestCase):
+    def test_dirty_worktree_is_refused_even_with_nothing_to_roll_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            git = ["git", "-C", str(root), "-c", "user.name=t", "-c", "user.email=t@t"]
+            subprocess.run(["git", "init", "-q", "-b", "main", str(root)], check=True)
+            (root / "a.py").write_text("a = 1\n")
+            subprocess.run([*git, "add", "a.py"], check=True)
+            subprocess.run([*git, "commit", "-q", "-m", "init"], check=True)
+            (root / ".git" / "info" / "exclude").write_text(".hydra/\n.agents/\ntasks/\nclaude.md\n")
+
+            def run(argv):
+                out, err = io.StringIO(), io.StringIO()
+                return hydra.main(argv, cwd=root, stdout=out, stderr=err), out.getvalue(), err.getvalue()
+
+            self.assertEqual(run(["init", "--session", "hydra-test"])[0], 0)
+            self.assertEqual(run(["task", "new", "T", "--allow", "a.py", "--id", "t1"])[0], 0)
+            self.assertEqual(run(["agent", "open", "a1", "--task", "t1", "--no-tmux"])[0], 0)
+            self.assertEqual(run(["rollback", "a1", "--task", "t1", "--to", "HEAD"])[1].strip(), "Nothing to rollback")
+            (root / ".agents" / "a1" / "t1" / "a.py").write_text("a = 2\n")
+            code, _out, err = run(["rollback", "a1", "--task", "t1", "--to", "HEAD"])
+            self.assertEqual(code, 2)
+            self.assertIn("uncommitted changes", err)
+
+
+if __name__ == "__main__":
+    unittest.main()